@@ -1,8 +1,36 @@
-from ._fig import Template, Fig, Subplot
-from ._datatypes import ExcelData
-from ._datatypes import ExcelDateData
-from ._aq_test import AquiferTestFigure
+from importlib import import_module
 
-create_hover = Template.create_hover
-add_to_hover_dict = Template.add_to_hover_dict
+__version__ = '0.1.0'
 
+#  public names and the module they live in. Modules are only imported when one of their names is first used,
+#  so `import figs` doesn't pull in pandas, geopandas or the pdf export stack (PEP 562)
+_exports = {
+    'Template': '_fig',
+    'Fig': '_fig',
+    'Subplot': '_fig',
+    'ExcelData': '_datatypes',
+    'ExcelDateData': '_datatypes',
+    'CsvDateData': '_datatypes',
+    'ExcelCache': '_cache',
+    'FigureCache': '_cache',
+    'WaterLevelStore': '_store',
+    'WellIndex': '_store',
+    'AquiferTestFigure': '_aq_test',
+}
+
+__all__ = list(_exports) + ['create_hover', 'add_to_hover_dict']
+
+
+def __getattr__(name):
+    if name in _exports:
+        value = getattr(import_module(f'.{_exports[name]}', __name__), name)
+    elif name in ('create_hover', 'add_to_hover_dict'):
+        value = getattr(__getattr__('Template'), name)
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,185 @@
+import base64
+import hashlib
+import numpy as np
+
+#  dtypes plotly.js can decode from a base64 typed array, little-endian
+TYPED_ARRAY_DTYPES = ('f8', 'f4', 'i4', 'u4', 'i2', 'u2', 'i1', 'u1')
+
+
+def dates_array(x) -> np.ndarray:
+    """x as a numpy array without going through python objects, datetime64 if x holds dates"""
+    if isinstance(x, np.ndarray):
+        return x
+    import pandas as pd
+    return pd.Index(x).to_numpy()
+
+
+def values_array(y, dtype='float32') -> np.ndarray:
+    """y as a numpy array of dtype, with anything that isn't a number as nan"""
+    if isinstance(y, np.ndarray) and y.dtype.kind in 'fiub':
+        return y.astype(dtype, copy=False)
+    import pandas as pd
+    return pd.to_numeric(pd.Series(y), errors='coerce').to_numpy(dtype=dtype, na_value=np.nan)
+
+
+def epoch_ms(x: np.ndarray) -> np.ndarray:
+    """datetime64 array as float64 milliseconds since the epoch, the numeric form plotly.js uses for date axes"""
+    ms = x.astype('datetime64[ms]').view('int64').astype('float64')
+    ms[np.isnat(x)] = np.nan
+    return ms
+
+
+def typed_array(arr: np.ndarray) -> dict | None:
+    """
+    Encode a numeric or datetime64 numpy array as a plotly.js base64 typed array spec. Dates are encoded as float64
+    milliseconds since the epoch. Returns None for arrays plotly.js can't decode as a typed array.
+    """
+    if arr.dtype.kind == 'M':
+        arr = epoch_ms(arr)
+    elif arr.dtype.kind == 'b':
+        arr = arr.astype('u1')
+    elif arr.dtype.kind in 'iu' and arr.dtype.itemsize == 8:
+        arr = arr.astype('f8')
+    elif arr.dtype.kind == 'f' and arr.dtype.itemsize == 2:
+        arr = arr.astype('f4')
+    if arr.dtype.kind not in 'fiu':
+        return None
+    arr = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder('<'))
+    dtype = f'{arr.dtype.kind}{arr.dtype.itemsize}'
+    if dtype not in TYPED_ARRAY_DTYPES:
+        return None
+    spec = {'dtype': dtype, 'bdata': base64.b64encode(arr.tobytes()).decode('ascii')}
+    if arr.ndim > 1:
+        spec['shape'] = ', '.join(str(size) for size in arr.shape)
+    return spec
+
+
+def from_typed_array(spec: dict) -> np.ndarray:
+    """numpy array of a plotly.js base64 typed array spec, the inverse of typed_array (dates come back as epoch ms)"""
+    arr = np.frombuffer(base64.b64decode(spec['bdata']), dtype=np.dtype(spec['dtype']).newbyteorder('<'))
+    if 'shape' in spec:
+        arr = arr.reshape([int(size) for size in str(spec['shape']).split(',')])
+    return arr
+
+
+def decode_typed_arrays(obj):
+    """
+    Copy of a figure dict (or any part of one) with every base64 typed array spec decoded to a numpy array. plotly.py
+    before 6 can't build a figure from typed array specs, so figure dicts that come back from the browser, such as
+    the figure State of a Dash graph, are decoded before go.Figure(...).
+    """
+    if isinstance(obj, dict):
+        if 'bdata' in obj and 'dtype' in obj:
+            return from_typed_array(obj)
+        return {key: decode_typed_arrays(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [decode_typed_arrays(item) for item in obj]
+    return obj
+
+
+def array_key(arr: np.ndarray) -> tuple:
+    """
+    Key of an array's contents, equal for arrays with the same dtype, shape and values. plotly's validators copy
+    arrays on assignment, so the x arrays that wells share are separate objects by the time a figure is saved,
+    and can only be matched by their contents.
+    """
+    arr = np.ascontiguousarray(arr)
+    return arr.dtype.str, arr.shape, hashlib.blake2b(arr.view('u1'), digest_size=16).digest()
+
+
+def regular_grid(x: np.ndarray, max_padding: float = 0.25):
+    """
+    The step and grid positions of x when x lies on a regular grid, logged at a fixed interval with possible gaps.
+    :param x: sorted array of numbers or datetime64
+    :param max_padding: most grid points without a value, as a fraction of len(x), for x to count as regular
+    :return: (step, positions) where positions are the grid indices of x, or None if x isn't on a regular grid
+    """
+    if len(x) < 2:
+        return None
+    units = x.astype('datetime64[ns]').view('int64') if x.dtype.kind == 'M' else x
+    steps = np.diff(units)
+    if not np.all(steps > 0):
+        return None
+    step = steps.min()
+    positions = (units - units[0]) / step
+    if not np.allclose(positions, np.rint(positions), rtol=0, atol=1e-6):
+        return None
+    positions = np.rint(positions).astype(np.int64)
+    if positions[-1] + 1 > len(x) * (1 + max_padding):
+        return None
+    return (np.timedelta64(int(step), 'ns') if x.dtype.kind == 'M' else step), positions
+
+
+def encode_regular_x(specs: list, min_points: int = 64, max_padding: float = 0.25) -> list:
+    """
+    Trace specs with regular x encoded as plotly x0/dx instead of an explicit x array, such as a transducer record
+    logged at a fixed interval. Gaps in the record are filled with NaN y values on the regular grid and drawn as
+    gaps with connectgaps False, so every well stays one trace. Dates are encoded as a millisecond x0 string and dx
+    in milliseconds.
+    :param specs: list of trace dicts with x and y
+    :param min_points: fewest points for a trace to be encoded as x0/dx
+    :param max_padding: most NaN values the gaps may add, as a fraction of the trace's points (see regular_grid)
+    :return: list of trace dicts
+    """
+    encoded = []
+    for spec in specs:
+        x, y = spec.get('x'), spec.get('y')
+        grid = None
+        if (
+                isinstance(x, np.ndarray) and x.dtype.kind in 'Mfiu' and len(x) >= min_points
+                and isinstance(y, np.ndarray) and len(y) == len(x)
+        ):
+            grid = regular_grid(x, max_padding)
+        if grid is None:
+            encoded.append(spec)
+            continue
+        step, positions = grid
+        spec = {key: value for key, value in spec.items() if key != 'x'} | _x0_dx(x[0], step)
+        if positions[-1] + 1 > len(x):
+            grid_y = np.full(positions[-1] + 1, np.nan, dtype=np.result_type(y.dtype, np.float32))
+            grid_y[positions] = y
+            spec.update(y=grid_y, connectgaps=False)
+        encoded.append(spec)
+    return encoded
+
+
+def _x0_dx(x0, step) -> dict:
+    """plotly x0 and dx of a regular run, dates as a millisecond string and milliseconds"""
+    if isinstance(x0, np.datetime64):
+        return {'x0': np.datetime_as_string(x0, unit='ms'), 'dx': float(step / np.timedelta64(1, 'ms'))}
+    return {'x0': float(x0), 'dx': float(step)}
+
+
+def _encode(obj, date_keys: set, key=None):
+    """replace numpy arrays in obj with typed array specs, collecting the keys that held dates"""
+    if isinstance(obj, dict):
+        return {k: _encode(v, date_keys, key=k) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)) and not isinstance(obj, str):
+        return [_encode(item, date_keys) for item in obj]
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind not in 'fiubM':
+            return obj
+        if obj.dtype.kind == 'M':
+            date_keys.add(key)
+        spec = typed_array(obj)
+        return obj if spec is None else spec
+    return obj
+
+
+def encode_typed_arrays(fig_dict: dict) -> dict:
+    """
+    Return a copy of a plotly figure dict where every numpy array in the traces is a base64 typed array spec, and
+    axes holding dates are set to type 'date' since their values are sent as epoch milliseconds.
+    """
+    data = []
+    layout = dict(fig_dict.get('layout', {}))
+    for trace in fig_dict.get('data', []):
+        date_keys = set()
+        data.append(_encode(trace, date_keys))
+        for axis in ('x', 'y'):
+            if axis in date_keys:
+                axis_ref = trace.get(f'{axis}axis', axis)
+                layout_key = f'{axis}axis{axis_ref[1:]}'
+                layout[layout_key] = dict(layout.get(layout_key, {}))
+                layout[layout_key].setdefault('type', 'date')
+    return fig_dict | {'data': data, 'layout': layout}
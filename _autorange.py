@@ -0,0 +1,242 @@
+import numpy as np
+
+#  plotly pads a padded axis by 5% of its length on each side, so the data spans 90% of the axis
+PAD_FRACTION = 0.05
+DEFAULT_MARKER_SIZE = 6
+#  smallest marker padding in pixels plotly gives a trace with markers, however small they are
+MIN_MARKER_PAD = 3
+#  plotly draws scatter traces without a mode as lines+markers below this many points, lines at or above it
+LINES_ONLY_POINTS = 20
+#  trace settings that change how a trace expands an axis, compared by value by AutorangeCache
+TRACE_SETTINGS = ('type', 'mode', 'fill', 'orientation', 'visible', 'xaxis', 'yaxis', 'x0', 'dx', 'y0', 'dy')
+
+
+def _trace_values(trace, axis_letter: str):
+    """values of a trace along an axis as a numpy array, also for traces with x0/dx instead of x"""
+    values = getattr(trace, axis_letter, None)
+    if values is not None:
+        return np.asarray(values)
+    start = getattr(trace, f'{axis_letter}0', None)
+    other = getattr(trace, 'y' if axis_letter == 'x' else 'x', None)
+    if start is None or other is None:
+        return None
+    step = getattr(trace, f'd{axis_letter}', None) or 1
+    if isinstance(start, str):
+        start = np.datetime64(start, 'ms').astype('int64')
+        return (start + np.arange(len(other)) * step).astype('datetime64[ms]')
+    return start + np.arange(len(other)) * step
+
+
+def _numeric_values(values: np.ndarray):
+    """
+    Numeric form of trace values: numbers as floats, and dates (datetime64, pd.Timestamp objects or ISO date
+    strings) as datetime64. None for values autorange can't place, such as category names.
+    """
+    if values.dtype.kind in 'fiuM':
+        return values
+    import pandas as pd
+    inferred = pd.api.types.infer_dtype(values.ravel(), skipna=True)
+    if inferred in ('integer', 'floating', 'mixed-integer-float', 'decimal'):
+        return pd.to_numeric(values.ravel(), errors='coerce').astype(float)
+    if inferred not in ('datetime64', 'datetime', 'date', 'string'):
+        return None
+    dates = pd.DatetimeIndex(pd.to_datetime(values.ravel(), errors='coerce'))
+    if inferred == 'string' and dates.isna().all():
+        return None
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    return dates.to_numpy('datetime64[ns]')
+
+
+def _mode(trace, n: int) -> str:
+    mode = getattr(trace, 'mode', None)
+    if mode is None:
+        return 'lines' if n >= LINES_ONLY_POINTS else 'lines+markers'
+    return mode
+
+
+def _marker_ppad(trace, n: int):
+    """
+    Marker padding in pixels, following plotly's calcMarkerSize: the marker size divided by 1.6 times sizeref (the
+    square root of that for sizemode 'area'), at least MIN_MARKER_PAD. An array with one pad per point for marker
+    sizes given per point.
+    """
+    marker = getattr(trace, 'marker', None)
+    size = getattr(marker, 'size', None)
+    size = DEFAULT_MARKER_SIZE if size is None else size
+    size_ref = 1.6 * (getattr(marker, 'sizeref', None) or 1)
+    if np.ndim(size):
+        #  points beyond the end of the size array, and missing sizes, count as size 0
+        sizes = np.zeros(n)
+        given = np.asarray(size, dtype=float)[:n]
+        sizes[:len(given)] = np.nan_to_num(given, nan=0.0)
+        size = sizes
+    size = np.clip(size, 0, None) / size_ref
+    if getattr(marker, 'sizemode', None) == 'area':
+        size = np.sqrt(size)
+    return np.maximum(size, MIN_MARKER_PAD)
+
+
+def _expansion(trace, axis_letter: str, n: int) -> dict:
+    """how a trace expands the autorange of an axis, following plotly's rules for scatter and bar traces"""
+    trace_type = getattr(trace, 'type', 'scatter')
+    if trace_type == 'bar':
+        value_letter = 'x' if getattr(trace, 'orientation', None) == 'h' else 'y'
+        if axis_letter == value_letter:
+            return {'padded': True, 'ppad': 0, 'tozero': True, 'half_step': False}
+        return {'padded': False, 'ppad': 0, 'tozero': False, 'half_step': True}
+    mode = _mode(trace, n)
+    markers, text = 'markers' in mode, 'text' in mode
+    ppad = _marker_ppad(trace, n) if markers else 0
+    fill = getattr(trace, 'fill', None) or 'none'
+    if axis_letter == 'x':
+        #  plotly only pads x for traces that draw markers, text or y error bars, and never for traces filled to y=0
+        error_bars = getattr(getattr(trace, 'error_y', None), 'visible', None)
+        padded = error_bars or ((markers or text) and fill not in ('tozeroy', 'tonexty'))
+        return {'padded': padded, 'ppad': ppad if padded else 0, 'tozero': fill == 'tozerox', 'half_step': False}
+    return {'padded': True, 'ppad': ppad, 'tozero': fill == 'tozeroy', 'half_step': False}
+
+
+def _extremes(values: np.ndarray, pads: np.ndarray, lowest: bool) -> tuple:
+    """
+    The (value, pad) points that can set one end of the range: points no other point passes with at least as much
+    padding, like plotly's collapseMinArray and collapseMaxArray
+    """
+    order = np.argsort(values if lowest else -values, kind='stable')
+    values, pads = values[order], pads[order]
+    #  a point is only a candidate if it pads more than every point further out
+    further_out = np.concatenate([[-np.inf], np.maximum.accumulate(pads)[:-1]])
+    keep = pads > further_out
+    return values[keep], pads[keep]
+
+
+def autorange(data, axis_letter: str = 'x', axis_ref: str = None, axis_type: str = None, length: float = None):
+    """
+    Compute the range plotly's autorange gives an axis, from the trace data with vectorized numpy, without rendering
+    the figure. Padded axes (y, and x for traces with markers or text) get 5% of the axis length on each side plus
+    the marker padding of plotly's calcMarkerSize, bar value axes include zero, and bar position axes extend by
+    half a bar. As in plotly, the range is the one that fits the data point and padding pair that needs the most
+    units per pixel.
+    :param data: traces of the figure
+    :param axis_letter: 'x' or 'y'
+    :param axis_ref: axis the traces refer to, such as 'x' or 'y2', defaults to axis_letter
+    :param axis_type: 'linear', 'log' or 'date', None to detect dates from the data
+    :param length: length of the axis in pixels, needed for the marker padding. None pads by exactly 5%
+    :return: (start, end) of the range, in log10 units for log axes and milliseconds since the epoch for date
+    axes, or None if no visible trace has data on the axis that can be placed (such as category names)
+    """
+    axis_ref = axis_letter if axis_ref is None else axis_ref
+    lows, highs = [], []
+    is_date = axis_type == 'date'
+    for trace in data:
+        if (getattr(trace, f'{axis_letter}axis', None) or axis_letter) != axis_ref:
+            continue
+        #  like plotly, hidden and legendonly traces don't count
+        if getattr(trace, 'visible', None) not in (True, None):
+            continue
+        values = _trace_values(trace, axis_letter)
+        if values is None or not len(values):
+            continue
+        values = _numeric_values(values)
+        if values is None:
+            return None
+        if values.dtype.kind == 'M':
+            is_date = True
+            missing = np.isnat(values)
+            values = values.astype('datetime64[ms]').astype('int64').astype(float)
+            values[missing] = np.nan
+        elif values.dtype.kind not in 'fiu':
+            continue
+        values = values.astype(float, copy=False)
+        expansion = _expansion(trace, axis_letter, len(values))
+        if axis_type == 'log':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = np.where(values > 0, np.log10(values), np.nan)
+        keep = np.isfinite(values)
+        if not keep.any():
+            continue
+        if expansion['padded']:
+            ppad = expansion['ppad'] if length else 0
+            pads = PAD_FRACTION * (1 if length is None else length) + np.broadcast_to(ppad, values.shape)
+        else:
+            pads = np.zeros(values.shape)
+        values, pads = values[keep], pads[keep]
+        if expansion['half_step']:
+            #  bars are centered on their positions, so the range extends by half the narrowest spacing
+            positions = np.unique(values)
+            half_step = float(np.min(np.diff(positions))) / 2 if len(positions) > 1 else 0.5
+            lows.append((values - half_step, pads))
+            highs.append((values + half_step, pads))
+            continue
+        if expansion['tozero'] and axis_type != 'log':
+            #  bars and fills to zero include zero, and aren't padded on the zero side
+            if values.min() >= 0:
+                lows.append((np.zeros(1), np.zeros(1)))
+                highs.append((values, pads))
+                continue
+            if values.max() <= 0:
+                lows.append((values, pads))
+                highs.append((np.zeros(1), np.zeros(1)))
+                continue
+        lows.append((values, pads))
+        highs.append((values, pads))
+    if not lows:
+        return None
+    low_values, low_pads = _extremes(*map(np.concatenate, zip(*lows)), lowest=True)
+    high_values, high_pads = _extremes(*map(np.concatenate, zip(*highs)), lowest=False)
+    start, end = float(low_values[0]), float(high_values[0])
+    if start >= end:
+        return (start - 1, end + 1) if not is_date else (start - 86_400_000, end + 86_400_000)
+    axis_length = 1 if length is None else length
+    #  the pair of a low and a high point that needs the most units per pixel sets the range
+    spans = high_values[np.newaxis, :] - low_values[:, np.newaxis]
+    pixels = np.maximum(axis_length - low_pads[:, np.newaxis] - high_pads[np.newaxis, :], axis_length * 0.1)
+    units_per_pixel = np.where(spans > 0, spans / pixels, -np.inf)
+    i, j = np.unravel_index(np.argmax(units_per_pixel), units_per_pixel.shape)
+    units_per_pixel = units_per_pixel[i, j]
+    return (float(low_values[i] - low_pads[i] * units_per_pixel),
+            float(high_values[j] + high_pads[j] * units_per_pixel))
+
+
+class AutorangeCache:
+    """
+    Cache of computed autoranges, valid until the traces of the figure change. An entry is reused while every
+    trace holds the same data and marker size arrays (compared by identity, so no pass over the data) with the same
+    settings that autorange reads (TRACE_SETTINGS, the marker size, sizeref and sizemode, and whether error bars
+    are visible), and the axis has the same type and length.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    @staticmethod
+    def _signature(data, axis_letter: str) -> tuple:
+        """per trace, the arrays autorange reads (compared by identity) and its settings (compared by value)"""
+        other_letter = 'y' if axis_letter == 'x' else 'x'
+        signature = []
+        for trace in data:
+            marker = getattr(trace, 'marker', None)
+            size = getattr(marker, 'size', None)
+            arrays = (getattr(trace, axis_letter, None), getattr(trace, other_letter, None),
+                      size if np.ndim(size) else None)
+            settings = tuple(getattr(trace, name, None) for name in TRACE_SETTINGS) + (
+                None if np.ndim(size) else size,
+                getattr(marker, 'sizeref', None),
+                getattr(marker, 'sizemode', None),
+                getattr(getattr(trace, 'error_x', None), 'visible', None),
+                getattr(getattr(trace, 'error_y', None), 'visible', None),
+            )
+            signature.append((arrays, settings))
+        return tuple(signature)
+
+    def get(self, data, axis_letter: str = 'x', axis_ref: str = None, axis_type: str = None, length: float = None):
+        """autorange of an axis (see autorange), computed only if the traces changed since the last call"""
+        key = (axis_letter, axis_ref, axis_type, None if length is None else round(length, 3))
+        signature = self._signature(data, axis_letter)
+        cached = self._entries.get(key)
+        if cached is not None and len(cached[0]) == len(signature) and all(
+                all(x is y for x, y in zip(a[0], b[0])) and a[1] == b[1] for a, b in zip(cached[0], signature)):
+            return cached[1]
+        value = autorange(data, axis_letter, axis_ref, axis_type, length)
+        self._entries[key] = (signature, value)
+        return value
@@ -0,0 +1,217 @@
+"""
+Render many Subplot figures from a manifest of jobs in a process pool. Run with:
+
+    python -m figs._batch manifest.json --workers 8
+
+The manifest is a json file like:
+
+    {
+        "store": "network_store",
+        "out_dir": "reports/2024Q2",
+        "formats": ["html", "pdf"],
+        "jobs": [
+            {
+                "name": "North Cluster",
+                "wells": ["MW-1", "MW-2", "MW-3"],
+                "precip": ["SeaTac Rain"],
+                "precip_agg": "D",
+                "flow": ["Creek Gauge"],
+                "locs": "gis/north_wells.gpkg",
+                "start": "2023-01-01",
+                "end": "2024-06-30"
+            }
+        ]
+    }
+
+The water level, precipitation and flow records are read from a WaterLevelStore (see WaterLevelStore.from_data),
+which every worker opens memory-mapped, so the data is loaded once on disk instead of being pickled to each worker.
+Job keys other than name, wells, precip, precip_agg, flow, locs, loc_name_field, start, end, formats, width and
+height are ignored. The name is the figure title, and the output files are named after it with the characters that
+aren't safe in a file name replaced (see file_name).
+"""
+from pathlib import Path
+import argparse
+import json
+import re
+import time
+import traceback
+
+#  store opened by each worker process, reused by every job the worker renders
+_worker_store = {}
+
+
+def _get_store(store_dir: Path):
+    from figs._store import WaterLevelStore
+    if store_dir not in _worker_store:
+        _worker_store[store_dir] = WaterLevelStore(store_dir)
+    return _worker_store[store_dir]
+
+
+def _series_frame(store, names: list, start=None, end=None):
+    """DataFrame with a date column and one column per series of the store, the shape add_precip expects"""
+    import pandas as pd
+    frames = []
+    for name in names:
+        dates, values = store.get(name, start=start, end=end)
+        frames.append(pd.Series(values, index=dates, name=name))
+    df = pd.concat(frames, axis=1).sort_index()
+    return df.rename_axis('date').reset_index()
+
+
+def build_job(store, job: dict):
+    """
+    Build the Subplot of a job: water levels, and precipitation, flow and a map of the wells if the job has them.
+    :param store: WaterLevelStore or WellIndex holding every series the job names
+    :param job: dict of a manifest job
+    :return: Subplot
+    """
+    from figs._fig import Subplot, add_trace_specs
+    from figs._arrays import dates_array, values_array
+    start, end = job.get('start'), job.get('end')
+    subplot = Subplot(
+        show_precip=bool(job.get('precip')),
+        show_map=bool(job.get('locs')),
+        show_flow=bool(job.get('flow')),
+    )
+    subplot.add_water_levels(store=store, wells=job.get('wells'), start=start, end=end)
+    if job.get('precip'):
+        precip_df = _series_frame(store, job['precip'], start=start, end=end)
+        subplot.add_precip(precip_df, agg=job.get('precip_agg'))
+    if job.get('flow'):
+        specs = []
+        for name in job['flow']:
+            dates, values = store.get(name, start=start, end=end)
+            specs.append(dict(type='scattergl', x=dates_array(dates), y=values_array(values), name=name,
+                              mode='lines'))
+        add_trace_specs(subplot.fig, specs, row=subplot.num_rows, col=1)
+    if job.get('locs'):
+        subplot.add_map(Path(job['locs']), loc_name_field=job.get('loc_name_field', 'ExploName'))
+    subplot.fig.update_layout(title_text=job['name'])
+    return subplot
+
+
+def file_name(name) -> str:
+    """
+    File name of a job's outputs: its name with path separators and other characters that aren't letters, digits,
+    spaces, dots, dashes or underscores replaced by underscores, so a name can't write outside out_dir
+    """
+    safe = re.sub(r'[^\w .-]', '_', str(name)).strip(' .')
+    assert safe, f'job name {name!r} has no characters usable in a file name'
+    return safe
+
+
+def _job_result(job: dict, error: str = None) -> dict:
+    return {'name': job.get('name'), 'outputs': [], 'build_seconds': None, 'export_seconds': None, 'error': error}
+
+
+def render_job(store_dir: Path, out_dir: Path, job: dict, formats=('html',)) -> dict:
+    """
+    Build and export the figure of one job. Runs in a worker process, and never raises so one bad job doesn't
+    stop the batch.
+    :return: dict with the job name, the output files, the seconds spent building and exporting, and the error
+    (None if the job succeeded)
+    """
+    result = _job_result(job)
+    try:
+        start = time.perf_counter()
+        subplot = build_job(_get_store(store_dir), job)
+        result['build_seconds'] = time.perf_counter() - start
+        start = time.perf_counter()
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for fmt in job.get('formats', formats):
+            out_path = out_dir / f"{file_name(job['name'])}.{fmt}"
+            if fmt == 'html':
+                subplot.fig.write_html(out_path, include_plotlyjs='cdn')
+            else:
+                subplot.fig.write_image(out_path, format=fmt, width=job.get('width', 1584),
+                                        height=job.get('height', 1224))
+            result['outputs'].append(str(out_path))
+        result['export_seconds'] = time.perf_counter() - start
+    except Exception:
+        result['error'] = traceback.format_exc()
+    return result
+
+
+def render_batch(manifest: dict | Path, workers: int | None = None, base_dir: Path = None) -> list:
+    """
+    Render every job of a manifest in a process pool.
+    :param manifest: manifest dict, or Path of a manifest json file
+    :param workers: number of worker processes, None uses every core
+    :param base_dir: directory relative paths in the manifest are resolved against. Defaults to the directory of
+    the manifest file, or the working directory for a dict
+    :return: list of job results (see render_job), in the order of the jobs in the manifest
+    """
+    if isinstance(manifest, Path):
+        base_dir = manifest.parent if base_dir is None else base_dir
+        manifest = json.loads(manifest.read_text())
+    base_dir = Path.cwd() if base_dir is None else base_dir
+    store_dir = base_dir / manifest['store']
+    out_dir = base_dir / manifest.get('out_dir', 'figures')
+    formats = tuple(manifest.get('formats', ('html',)))
+    #  jobs are copied before their paths are resolved, so the caller's manifest is left as it was
+    jobs = [dict(job) for job in manifest['jobs']]
+    for job in jobs:
+        assert 'name' in job, 'every job needs a name'
+        if job.get('locs'):
+            job['locs'] = str(base_dir / job['locs'])
+    names = [file_name(job['name']).lower() for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    assert not duplicates, f'jobs would write to the same files: {duplicates}'
+    return _render_jobs(store_dir, out_dir, jobs, formats, workers)
+
+
+def _render_jobs(store_dir: Path, out_dir: Path, jobs: list, formats: tuple, workers: int | None) -> list:
+    """
+    Render jobs in a process pool. A worker that dies, such as a crash in a native library or the OOM killer,
+    breaks the pool and every job still running or waiting in it. Those jobs are rendered again one at a time in a
+    new single worker pool, where a job that breaks the pool is the one that killed it, so only that job is marked
+    failed and the pool is restarted for the rest.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    results = [None] * len(jobs)
+    pending = list(range(len(jobs)))
+    while pending:
+        broken = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {i: executor.submit(render_job, store_dir, out_dir, jobs[i], formats) for i in pending}
+            for i, future in futures.items():
+                try:
+                    results[i] = future.result()
+                except BrokenProcessPool:
+                    broken.append(i)
+        if broken and workers == 1:
+            #  jobs run in order in a single worker, so the first broken job is the one whose worker died
+            results[broken[0]] = _job_result(jobs[broken[0]], 'the worker process rendering this job died')
+            broken = broken[1:]
+        pending, workers = broken, 1
+    return results
+
+
+def print_report(results: list):
+    """print the timing of every job, then the errors of the jobs that failed"""
+    for result in results:
+        if result['error'] is None:
+            print(f"    {result['name']:<40}{result['build_seconds']:8.2f} s build {result['export_seconds']:8.2f} s export")
+        else:
+            print(f"    {result['name']:<40}  FAILED")
+    failed = [result for result in results if result['error'] is not None]
+    print(f'{len(results) - len(failed)} of {len(results)} figures rendered')
+    for result in failed:
+        print(f"\n{result['name']}:\n{result['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render a manifest of figure jobs in a process pool.')
+    parser.add_argument('manifest', type=Path, help='manifest json file')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes, defaults to every core')
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    results = render_batch(args.manifest, workers=args.workers)
+    print_report(results)
+    print(f'total {time.perf_counter() - start:.1f} s')
+    return 0 if all(result['error'] is None for result in results) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
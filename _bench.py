@@ -0,0 +1,260 @@
+"""
+Benchmarks for figs. Run with:
+
+    python -m figs._bench
+"""
+from pathlib import Path
+import json
+import subprocess
+import sys
+import timeit
+
+#  modules that shouldn't be loaded by a bare `import figs`
+HEAVY_MODULES = (
+    'pandas', 'geopandas', 'shapely', 'plotly.subplots', 'svglib', 'reportlab', 'svgpathtools', 'bokeh', 'cairosvg',
+)
+
+
+def bench_fig_construction(number: int = 200, repeat: int = 5) -> dict:
+    """
+    Time constructing empty figures, which is the fixed cost paid for every per-well figure in a batch.
+    :param number: number of figures constructed per timing
+    :param repeat: number of timings, the best is kept
+    :return: dict of figure class name to milliseconds per figure
+    """
+    from figs._fig import BaseFig, Fig, Subplot, Template
+    constructors = {
+        'Template': Template,
+        'BaseFig': BaseFig,
+        'Fig': Fig,
+        'Subplot': Subplot,
+        'Subplot(show_precip, show_map)': lambda: Subplot(show_precip=True, show_map=True),
+    }
+    results = {}
+    for name, constructor in constructors.items():
+        best = min(timeit.repeat(constructor, number=number, repeat=repeat))
+        results[name] = best / number * 1000
+    return results
+
+
+def bench_import_time(repeat: int = 5, max_seconds: float = None) -> dict:
+    """
+    Time a cold `import figs` in a fresh interpreter, and check which heavy modules it loaded. Every batch worker and
+    Dash process pays this cost, so it doubles as a regression guard for the lazy imports in figs/__init__.py.
+    :param repeat: number of fresh interpreters to time, the best is kept
+    :param max_seconds: if given, fail when the best import time is slower than this
+    :return: dict of the import time in milliseconds and the heavy modules that were loaded
+    """
+    code = (
+        'import sys, time, json\n'
+        'start = time.perf_counter()\n'
+        'import figs\n'
+        'elapsed = time.perf_counter() - start\n'
+        f'heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]\n'
+        'print(json.dumps([elapsed, heavy]))\n'
+    )
+    package_parent = Path(__file__).resolve().parent.parent
+    timings, heavy = [], []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=package_parent, capture_output=True, text=True, check=True
+        ).stdout
+        elapsed, heavy = json.loads(out.splitlines()[-1])
+        timings.append(elapsed)
+    best = min(timings)
+    assert not heavy, f'import figs loaded heavy modules: {heavy}'
+    if max_seconds is not None:
+        assert best <= max_seconds, f'import figs took {best:.3f} s, more than {max_seconds} s'
+    return {'import figs': best * 1000, 'heavy modules loaded': len(heavy)}
+
+
+def bench_serialization(n_wells: int = 20, n_points: int = 50_000, repeat: int = 3) -> dict:
+    """
+    Compare the round-trip time and size of a water level figure saved with Fig.save, with and without
+    compression, plotly json and pickle.
+    :param n_wells: number of water level traces
+    :param n_points: number of points per trace
+    :param repeat: number of timings, the best is kept
+    :return: dict of format to round-trip milliseconds and size in kB
+    """
+    import io
+    import pickle
+    import numpy as np
+    import plotly.io as pio
+    from figs._fig import Fig
+    x = (np.datetime64('2015-01-01', 'ns') + np.arange(n_points) * np.timedelta64(15, 'm')).astype('datetime64[ns]')
+    fig = Fig()
+    for i in range(n_wells):
+        fig.add_scattergl(x=x, y=np.random.default_rng(i).normal(100, 5, n_points).astype('float32'), name=f'MW-{i}')
+
+    def save_load(compress=False):
+        buffer = io.BytesIO()
+        fig.save(buffer, compress=compress)
+        Fig.load(buffer.getvalue())
+        return buffer.getbuffer().nbytes
+
+    def compressed_save_load():
+        return save_load(compress=True)
+
+    def json_round_trip():
+        text = pio.to_json(fig)
+        pio.from_json(text)
+        return len(text)
+
+    def pickle_round_trip():
+        data = pickle.dumps(fig)
+        pickle.loads(data)
+        return len(data)
+
+    results = {}
+    for name, round_trip in {'Fig.save/load': save_load, 'Fig.save/load compressed': compressed_save_load,
+                             'plotly json': json_round_trip, 'pickle': pickle_round_trip}.items():
+        size = round_trip()
+        best = min(timeit.repeat(round_trip, number=1, repeat=repeat))
+        results[f'{name} (ms)'] = best * 1000
+        results[f'{name} (kB)'] = size / 1000
+    return results
+
+
+def check_scalable_figure() -> dict:
+    """
+    Build a ScalableFigure and an AquiferTestFigure with their scale settings, and check that they survive the pickle
+    round trip that sends them to figs._book workers, and that the computed plot area is only used when it's exact.
+    :return: dict of check name to 1 for every check that passed
+    """
+    import pickle
+    from figs.figure_transforms import ScalableFigure
+    from figs._aq_test import AquiferTestFigure
+    fig = ScalableFigure(verify_svg=True, plot_width_in_base_units=11, plot_height_in_base_units=8.5)
+    assert fig.verify_svg is True
+    fig.verify_svg = False
+    fig.add_scatter(x=[0, 100, 200], y=[10, 12, 11], mode='lines')
+    fig.x_scale = 100
+    assert fig.plot_area['exact'], f'plot area of a figure without a legend should be exact: {fig.plot_area}'
+    fig.add_scatter(x=[0, 200], y=[11, 11], mode='lines', name='second')
+    fig.add_scatter(x=[0, 200], y=[12, 12], mode='lines', name='third')
+    assert not fig.plot_area['exact'], 'plot area of a figure with a legend should be measured'
+    copy = pickle.loads(pickle.dumps(fig))
+    assert type(copy) is ScalableFigure and copy.x_scale == 100 and len(copy.data) == 3
+    assert copy.plot_width == 11 * 72 and copy.verify_svg is False
+    aq_fig = AquiferTestFigure()
+    aq_copy = pickle.loads(pickle.dumps(aq_fig))
+    assert type(aq_copy) is AquiferTestFigure and aq_copy.x_scale == 1
+    return {'ScalableFigure': 1, 'AquiferTestFigure': 1, 'pickle round trip': 1}
+
+
+def check_autorange_parity(width: int = 700, height: int = 450, tolerance: float = 1e-6) -> dict:
+    """
+    Compare the ranges figs._autorange computes with the ones plotly's full_figure_for_development returns, for
+    line-only traces, markers, per-point marker sizes, a mix of traces, hidden traces and dates given as timestamps
+    or strings.
+    :param width: figure width in pixels
+    :param height: figure height in pixels
+    :param tolerance: largest difference allowed, as a fraction of the axis range
+    :return: dict of case and axis to the difference as a fraction of the axis range
+    """
+    import numpy as np
+    import pandas as pd
+    import plotly.graph_objects as go
+    from figs._autorange import autorange
+    x = np.arange(10.0)
+    y = x ** 2
+    cases = {
+        'lines': [go.Scatter(x=x, y=y, mode='lines')],
+        'markers': [go.Scatter(x=x, y=y, mode='markers')],
+        'default mode': [go.Scatter(x=x, y=y)],
+        'marker sizes': [go.Scatter(x=x, y=y, mode='markers', marker_size=np.linspace(4, 30, len(x)))],
+        'lines and markers': [
+            go.Scatter(x=x, y=y, mode='lines'),
+            go.Scatter(x=x[::3], y=y[::3] + 5, mode='markers', marker_size=12),
+        ],
+        'hidden traces': [
+            go.Scatter(x=x, y=y / 40, mode='lines'),
+            go.Scatter(x=x * 100, y=y * 10, mode='lines', visible=False),
+            go.Scatter(x=x * 100, y=y * 10, mode='lines', visible='legendonly'),
+        ],
+        'timestamp dates': [go.Scatter(x=list(pd.date_range('2020-01-01', periods=len(x), freq='D')), y=y)],
+        'string dates': [go.Scatter(x=[f'2020-01-{day:02d}' for day in range(1, len(x) + 1)], y=y, mode='lines')],
+    }
+    margin = dict(l=80, r=80, t=100, b=80)
+    lengths = {'x': width - margin['l'] - margin['r'], 'y': height - margin['t'] - margin['b']}
+    results = {}
+    for name, data in cases.items():
+        fig = go.Figure(data, layout=dict(width=width, height=height, margin=margin, showlegend=False))
+        full_fig = fig.full_figure_for_development(warn=False)
+        for axis in ('x', 'y'):
+            #  date ranges come back as strings, autorange gives milliseconds since the epoch
+            expected = [pd.Timestamp(value).value / 1e6 if isinstance(value, str) else value
+                        for value in full_fig.layout[f'{axis}axis'].range]
+            computed = autorange(fig.data, axis, length=lengths[axis])
+            error = max(abs(a - b) for a, b in zip(expected, computed)) / (expected[1] - expected[0])
+            assert error <= tolerance, f'{name} {axis} range {computed} differs from plotly\'s {expected}'
+            results[f'{name} {axis}'] = error
+    return results
+
+
+def print_results(title: str, results: dict, unit: str = 'ms'):
+    print(title)
+    for name, value in results.items():
+        print(f'    {name:<40}{value:10.3f} {unit}')
+
+
+
+def check_regular_x() -> dict:
+    """
+    Check that encode_regular_x sends a gapped logger record as one x0/dx trace with NaN in its gaps, and leaves
+    irregular records and records with too many gaps as explicit x arrays.
+    :return: dict of check name to 1 for every check that passed
+    """
+    import numpy as np
+    from figs._arrays import encode_regular_x
+    start = np.datetime64('2020-01-01T00:00', 'ns')
+    x = start + np.arange(100) * np.timedelta64(15, 'm')
+    y = np.arange(100, dtype='float32')
+    gapped = np.delete(np.arange(100), np.arange(40, 50))
+    irregular = np.sort(np.random.default_rng(0).choice(10_000, 100, replace=False))
+    sparse = np.arange(0, 300, 3)
+    regular, gaps, other, too_sparse = encode_regular_x([
+        dict(x=x, y=y),
+        dict(x=x[gapped], y=y[gapped]),
+        dict(x=start + irregular * np.timedelta64(1, 'm'), y=y),
+        dict(x=np.concatenate([x[:10], start + (sparse[10:] + 1000) * np.timedelta64(15, 'm')]), y=y),
+    ])
+    assert 'x' not in regular and regular['dx'] == 15 * 60 * 1000 and regular['x0'] == '2020-01-01T00:00:00.000'
+    assert 'connectgaps' not in regular and np.array_equal(regular['y'], y)
+    assert 'x' not in gaps and gaps['connectgaps'] is False and len(gaps['y']) == 100
+    assert np.isnan(gaps['y'][40:50]).all() and np.array_equal(gaps['y'][gapped], y[gapped])
+    assert 'x' in other and 'x' in too_sparse
+    return {'regular x0/dx': 1, 'gaps as NaN': 1, 'irregular kept': 1}
+
+
+def check_hover_formats() -> dict:
+    """
+    Check the hover text create_hover builds: dates in plotly's date form, floats with two decimals, and nullable
+    integers as integers.
+    :return: dict of check name to 1 for every check that passed
+    """
+    import numpy as np
+    import pandas as pd
+    from figs._fig import Template
+    custom_data, hover_template = Template.create_hover({
+        'Date': pd.Series(pd.to_datetime(['2020-01-01', '2020-02-01'])),
+        'Time': pd.to_datetime(['2020-01-01 06:30', None]),
+        'Level': np.array([1.234, 5.678]),
+        'Count': pd.Series([3, None], dtype='Int64'),
+    })
+    assert list(custom_data[:, 0]) == ['2020-01-01', '2020-02-01'], custom_data[:, 0]
+    assert list(custom_data[:, 1]) == ['2020-01-01 06:30:00', ''], custom_data[:, 1]
+    assert list(custom_data[:, 3]) == [3, None], custom_data[:, 3]
+    assert '%{customdata[2]:.2f}' in hover_template and '%{customdata[3]}<br>' in hover_template
+    return {'dates': 1, 'floats': 1, 'nullable integers': 1}
+
+if __name__ == '__main__':
+    print_results('checks', check_scalable_figure(), unit='')
+    print_results('regular x checks', check_regular_x(), unit='')
+    print_results('hover checks', check_hover_formats(), unit='')
+    print_results('autorange parity (fraction of range)', check_autorange_parity(), unit='')
+    print_results('import time (cold interpreter)', bench_import_time())
+    print_results('figure construction (per figure)', bench_fig_construction())
+    print_results('figure serialization (round trip)', bench_serialization(), unit='')
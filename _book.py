@@ -0,0 +1,104 @@
+"""
+Export many scaled figures (ScalableFigure, AquiferTestFigure) as the pages of one PDF.
+
+Simple Example:
+
+    timings = write_book(cross_sections, Path('cross_sections.pdf'), workers=4, x_scale=200)
+    print_timings(timings)
+
+Pages are rendered to scaled SVGs in worker processes, and the main process streams them into the PDF one page at
+a time, in order. At most a few pages per worker are in flight, so a book of hundreds of sheets never holds every
+drawing in memory at once.
+"""
+from collections import deque
+import time
+
+
+def _init_worker():
+    from figs._export import render_in_process
+    render_in_process()
+
+
+def render_page(fig, adjust_by: str = 'range', x_scale: int = None, y_scale: int = None) -> dict:
+    """
+    Render the scaled SVG of one page. Runs in a worker process.
+    :param fig: ScalableFigure
+    :param adjust_by: 'range' or 'page', see ScalableFigure.to_scaled_pdf
+    :param x_scale: x scale to set on the figure before rendering, None keeps the figure's
+    :param y_scale: y scale to set on the figure before rendering, None keeps the figure's
+    :return: dict with the svg bytes, the factors to scale its drawing by, and the render seconds
+    """
+    start = time.perf_counter()
+    if x_scale is not None:
+        fig.x_scale = x_scale
+    if y_scale is not None:
+        fig.y_scale = y_scale
+    svg, scale_x, scale_y = fig.scaled_svg(adjust_by=adjust_by)
+    return {'svg': svg, 'scale_x': scale_x, 'scale_y': scale_y, 'render_seconds': time.perf_counter() - start}
+
+
+def write_book(
+        figs,
+        file,
+        workers: int | None = None,
+        adjust_by: str = 'range',
+        x_scale: int = None,
+        y_scale: int = None,
+        pages_in_flight: int = None,
+) -> list:
+    """
+    Write scaled figures as the pages of one PDF, rendering them in parallel worker processes.
+    :param figs: iterable of ScalableFigures, one per page, in page order
+    :param file: path or writable binary file object to write the PDF to
+    :param workers: number of worker processes, None uses every core
+    :param adjust_by: 'range' or 'page', see ScalableFigure.to_scaled_pdf
+    :param x_scale: x scale of every page, None keeps the scale of each figure
+    :param y_scale: y scale of every page, None keeps the scale of each figure
+    :param pages_in_flight: most pages submitted but not yet written, defaults to twice the number of workers
+    :return: list of dicts with the page number, render seconds in the worker and draw seconds in this process
+    """
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    from reportlab.graphics import renderPDF
+    from reportlab.pdfgen import canvas
+    from figs.figure_transforms import svg_drawing
+    workers = os.cpu_count() if workers is None else workers
+    pages_in_flight = 2 * workers if pages_in_flight is None else pages_in_flight
+    pdf = canvas.Canvas(os.fspath(file) if isinstance(file, os.PathLike) else file)
+    timings = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        pending = deque()
+        figs = iter(figs)
+
+        def submit_next():
+            fig = next(figs, None)
+            if fig is not None:
+                pending.append(executor.submit(render_page, fig, adjust_by, x_scale, y_scale))
+
+        for i in range(pages_in_flight):
+            submit_next()
+        while pending:
+            page = pending.popleft().result()
+            submit_next()
+            start = time.perf_counter()
+            drawing = svg_drawing(page['svg'])
+            drawing.width, drawing.height = drawing.width * page['scale_x'], drawing.height * page['scale_y']
+            drawing.scale(page['scale_x'], page['scale_y'])
+            pdf.setPageSize((drawing.width, drawing.height))
+            renderPDF.draw(drawing, pdf, 0, 0)
+            pdf.showPage()
+            timings.append({
+                'page': len(timings) + 1,
+                'render_seconds': page['render_seconds'],
+                'draw_seconds': time.perf_counter() - start,
+            })
+    pdf.save()
+    return timings
+
+
+def print_timings(timings: list):
+    """print the render and draw time of every page and the totals"""
+    for timing in timings:
+        print(f"    page {timing['page']:<6}{timing['render_seconds']:8.2f} s render {timing['draw_seconds']:8.2f} s draw")
+    print(f"{len(timings)} pages, {sum(timing['render_seconds'] for timing in timings):.1f} s rendering, "
+          f"{sum(timing['draw_seconds'] for timing in timings):.1f} s drawing")
@@ -0,0 +1,352 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import pandas as pd
+
+
+def evict_lru(cache_dir: Path, patterns: str | tuple, max_bytes: int):
+    """
+    Remove the least recently used files matching patterns in cache_dir until their total size is no bigger than
+    max_bytes. Files are ranked by mtime, which reads touch to mark a file as recently used.
+    :param patterns: glob pattern, or tuple of patterns whose files share the budget
+    """
+    if not cache_dir.exists():
+        return
+    if isinstance(patterns, str):
+        patterns = (patterns,)
+    entries = []
+    for path in {path for pattern in patterns for path in cache_dir.glob(pattern)}:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def _touch(path: Path):
+    """mark a cached file as the most recently used, unless another process evicted it meanwhile"""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+class ExcelCache:
+    """
+    On-disk columnar cache for DataFrames parsed from excel (or other slow to parse) files.
+
+    Each parsed sheet is stored as an Arrow IPC (feather) file so a warm load is a memory-mapped
+    columnar read instead of a full openpyxl parse. Entries are keyed on the file's content hash
+    together with the read options, and a small stat file maps the path, size and mtime of a file
+    to its content hash so a warm load doesn't need to re-hash the file either. A file that changes
+    gets a new entry, and the least recently used tables are removed once the cache grows past
+    max_bytes.
+
+    Simple Example:
+
+        cache = ExcelCache()
+        df = cache.read(Path('wls.xlsx'), pd.read_excel)
+
+    Requires pyarrow. If pyarrow is not installed the cache is disabled and every read goes
+    straight to the reader.
+    """
+
+    def __init__(self, cache_dir: Path = None, max_bytes: int = 2_000_000_000):
+        """
+        :param cache_dir: directory to keep cached tables in. Defaults to ~/.figs/cache
+        :param max_bytes: total size of the cached tables and stat files, the least recently used are removed past it
+        """
+        self._cache_dir = None
+        self.cache_dir = Path.home() / '.figs' / 'cache' if cache_dir is None else cache_dir
+        self.max_bytes = max_bytes
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @cache_dir.setter
+    def cache_dir(self, val):
+        assert isinstance(val, Path), 'cache_dir must be a Path object'
+        self._cache_dir = val
+
+    @property
+    def enabled(self):
+        """True if pyarrow is available to read and write the cached tables"""
+        try:
+            import pyarrow
+        except ImportError:
+            return False
+        return True
+
+    @staticmethod
+    def content_hash(path: Path) -> str:
+        """hash of the file contents"""
+        with open(path, 'rb') as file:
+            return hashlib.file_digest(file, 'blake2b').hexdigest()
+
+    @staticmethod
+    def _stat_key(path: Path) -> str:
+        """key from the resolved path, size and mtime of a file"""
+        stat = path.stat()
+        key = f'{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}'
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _options_key(read_kwargs: dict) -> str:
+        """key from the options passed to the reader, so different sheets or columns don't collide"""
+        options = json.dumps(read_kwargs, sort_keys=True, default=str)
+        return hashlib.blake2b(options.encode(), digest_size=8).hexdigest()
+
+    def _write_atomic(self, path: Path, write):
+        """write to a temporary file and move it into place, so concurrent readers never see partial files"""
+        temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        write(temp_path)
+        os.replace(temp_path, path)
+
+    def get_content_hash(self, path: Path) -> str:
+        """content hash of a file, only re-hashing the file when its path, size or mtime changed"""
+        stat_path = self.cache_dir / f'{self._stat_key(path)}.stat'
+        try:
+            content_hash = stat_path.read_text()
+        except FileNotFoundError:
+            pass
+        else:
+            #  stat files share the tables' budget, so a read marks them as recently used too
+            _touch(stat_path)
+            return content_hash
+        content_hash = self.content_hash(path)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._write_atomic(stat_path, lambda temp_path: temp_path.write_text(content_hash))
+        return content_hash
+
+    def table_path(self, path: Path, **read_kwargs) -> Path:
+        """path of the cached table for a file read with the given options"""
+        return self.cache_dir / f'{self.get_content_hash(path)}-{self._options_key(read_kwargs)}.arrow'
+
+    def read(self, path: Path, reader=pd.read_excel, **read_kwargs) -> pd.DataFrame:
+        """
+        Read a file through the cache. On a miss the file is parsed with reader(path, **read_kwargs) and the result
+        is stored; on a hit the cached table is memory-mapped and the reader is never called.
+        :param path: Path of the file to read
+        :param reader: function to parse the file into a DataFrame, defaults to pd.read_excel
+        :param read_kwargs: keyword arguments passed to the reader, also part of the cache key
+        :return: DataFrame
+        """
+        if not self.enabled:
+            return reader(path, **read_kwargs)
+        from pyarrow import feather
+        table_path = self.table_path(path, **read_kwargs)
+        if table_path.exists():
+            _touch(table_path)
+            return feather.read_table(table_path, memory_map=True).to_pandas()
+        df = reader(path, **read_kwargs)
+        self.write(table_path, df)
+        return df
+
+    def read_after(self, path: Path, column, after, reader=pd.read_excel, **read_kwargs) -> pd.DataFrame:
+        """
+        Read only the rows of a file where column is greater than after. If the file is already cached the filter
+        runs on the memory-mapped table, so only the matching rows are converted to pandas.
+        :param path: Path of the file to read
+        :param column: name of the column to filter on, such as the date column
+        :param after: rows with column values greater than this are returned
+        :param reader: function to parse the file into a DataFrame on a cache miss
+        :param read_kwargs: keyword arguments passed to the reader, also part of the cache key
+        :return: DataFrame
+        """
+        if self.enabled:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+            from pyarrow import feather
+            table_path = self.table_path(path, **read_kwargs)
+            if table_path.exists():
+                _touch(table_path)
+                table = feather.read_table(table_path, memory_map=True)
+                values = table[str(column)]
+                mask = pc.greater(values, pa.scalar(after, type=values.type))
+                return table.filter(mask).to_pandas()
+        df = self.read(path, reader, **read_kwargs)
+        return df[df[column] > after]
+
+    def write(self, table_path: Path, df: pd.DataFrame):
+        """
+        store a DataFrame as an uncompressed Arrow table, then remove the least recently used tables past max_bytes.
+        DataFrames arrow can't represent are not cached
+        """
+        import pyarrow as pa
+        from pyarrow import feather
+        try:
+            table = pa.Table.from_pandas(df)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            print(f"can't cache table for: {table_path.name}")
+            return
+        table_path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_atomic(
+            table_path,
+            lambda temp_path: feather.write_feather(table, temp_path, compression='uncompressed')
+        )
+        self.evict()
+
+    def evict(self):
+        """
+        remove the least recently used tables and stat files until together they are no bigger than max_bytes.
+        Stat files of files that have since changed are never read again, so they are the first to go
+        """
+        evict_lru(self.cache_dir, ('*.arrow', '*.stat'), self.max_bytes)
+
+    def clear(self):
+        """remove all cached tables and stat files"""
+        if not self.cache_dir.exists():
+            return
+        for path in self.cache_dir.iterdir():
+            if path.suffix in ('.arrow', '.stat', '.tmp'):
+                path.unlink()
+
+
+class FigureCache:
+    """
+    Size-bounded, least recently used, on-disk cache of built figures, keyed on the content of their input data,
+    the options they were built with and the figs version. A repeat render of the same inputs is one read of a
+    figure saved with Fig.save instead of a full rebuild.
+
+    Simple Example:
+
+        cache = FigureCache()
+        fig = cache.get_or_build(
+            lambda: build_subplot(df, precip_df),
+            df, precip_df,
+            show_precip=True, show_map=False, trace_specs=trace_specs
+        )
+    """
+
+    def __init__(self, cache_dir: Path = None, max_bytes: int = 500_000_000):
+        """
+        :param cache_dir: directory to keep cached figures in. Defaults to ~/.figs/figures
+        :param max_bytes: total size of the cached figures, the least recently used are removed past it
+        """
+        self._cache_dir = None
+        self.cache_dir = Path.home() / '.figs' / 'figures' if cache_dir is None else cache_dir
+        self.max_bytes = max_bytes
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @cache_dir.setter
+    def cache_dir(self, val):
+        assert isinstance(val, Path), 'cache_dir must be a Path object'
+        self._cache_dir = val
+
+    @classmethod
+    def _update_hash(cls, digest, obj):
+        """add the content of an input to the hash"""
+        import numpy as np
+        if isinstance(obj, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+            columns = obj.columns if isinstance(obj, pd.DataFrame) else [obj.name]
+            digest.update(json.dumps([str(col) for col in columns]).encode())
+            digest.update(str(obj.dtypes).encode())
+        elif isinstance(obj, np.ndarray):
+            digest.update(str(obj.dtype).encode())
+            digest.update(np.ascontiguousarray(obj).tobytes())
+        elif isinstance(obj, Path) and obj.is_file():
+            digest.update(ExcelCache.content_hash(obj).encode())
+        elif isinstance(obj, (list, tuple)):
+            for item in obj:
+                cls._update_hash(digest, item)
+        elif isinstance(obj, dict):
+            #  values such as arrays and DataFrames in options are hashed by content, not by their truncated str
+            for k in sorted(obj, key=str):
+                digest.update(json.dumps(str(k)).encode())
+                cls._update_hash(digest, obj[k])
+        elif hasattr(obj, 'excel_paths') and hasattr(obj, 'read_kwargs'):
+            #  ExcelData is keyed on the contents of its files and how they are read, so the workbooks are never
+            #  parsed just to build the key. Its ExcelCache only re-hashes files whose size or mtime changed
+            digest.update(type(obj).__name__.encode())
+            cache = getattr(obj, 'cache', None)
+            for path in obj.excel_paths:
+                content_hash = ExcelCache.content_hash(path) if cache is None else cache.get_content_hash(path)
+                digest.update(content_hash.encode())
+            cls._update_hash(digest, obj.read_kwargs)
+        elif hasattr(obj, 'dfs'):
+            cls._update_hash(digest, obj.dfs)
+        else:
+            digest.update(json.dumps(obj, sort_keys=True, default=str).encode())
+
+    def key(self, *inputs, **options) -> str:
+        """
+        Key of a figure built from inputs with options
+        :param inputs: DataFrames, Series, numpy arrays, file Paths, ExcelData, or lists of them
+        :param options: options the figure is built with, such as show_precip, show_map, show_flow and trace_specs.
+        Arrays and DataFrames among them are hashed by content like the inputs
+        """
+        from figs import __version__
+        digest = hashlib.blake2b(digest_size=20)
+        self._update_hash(digest, list(inputs))
+        self._update_hash(digest, options)
+        digest.update(__version__.encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.cache_dir / f'{key}.figz'
+
+    def get(self, key: str):
+        """the cached figure for key as a Fig, or None"""
+        from figs._fig import Fig
+        path = self.path(key)
+        try:
+            fig = Fig.load(path)
+        except FileNotFoundError:
+            return None
+        #  reading a figure makes it the most recently used
+        _touch(path)
+        return fig
+
+    def put(self, key: str, fig):
+        """store a figure, then remove the least recently used figures past max_bytes"""
+        from figs._serialize import save_fig
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        save_fig(fig, temp_path)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def get_or_build(self, build, *inputs, **options):
+        """
+        Get the figure built from inputs with options, calling build() to make it on a miss.
+        :param build: function with no arguments that returns a figure or a Subplot
+        :param inputs: the data the figure is built from, hashed for the key
+        :param options: the options the figure is built with, part of the key
+        :return: the figure as a Fig, both on a hit and on a miss
+        """
+        from figs._fig import Fig
+        key = self.key(*inputs, **options)
+        fig = self.get(key)
+        if fig is None:
+            fig = build()
+            fig = getattr(fig, 'fig', fig)
+            self.put(key, fig)
+            if not isinstance(fig, Fig):
+                #  built the same way Fig.load builds a hit
+                fig = Fig(data=fig.data, layout=fig.layout)
+        return fig
+
+    def evict(self):
+        """remove the least recently used figures until the cache is no bigger than max_bytes"""
+        evict_lru(self.cache_dir, '*.figz', self.max_bytes)
+
+    def clear(self):
+        """remove all cached figures"""
+        if not self.cache_dir.exists():
+            return
+        for path in self.cache_dir.iterdir():
+            if path.suffix in ('.figz', '.tmp'):
+                path.unlink()
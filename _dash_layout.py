@@ -95,6 +95,17 @@ def create_layout(app: Dash) -> dbc.Container:
                              id=ids.OPEN_FIG, 
                         ),
                         dcc.Store(ids.STORE_OPENED_FIG),
+                        dbc.Button("S",
+                                   id=ids.SAVE_FIG_NONRESAMPLED,
+                                   size='sm',
+                                   color='Warning',
+                                   style={
+                                       'display':'inline',
+                                       'width': '2vw',
+                                       'padding': '1px',
+                                       'margin': '1px',
+                                       }),
+                        dcc.Download(id=ids.SAVE_FIG),
                         dbc.Button("F", 
                                    id=ids.TOGGLE_FULLSCREEN,
                                    size='sm',
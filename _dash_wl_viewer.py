@@ -16,6 +16,11 @@ from dash.exceptions import PreventUpdate
 import copy
 import os
 from figs._fig import Template, Fig
+from figs._datatypes import ExcelDateData
+from figs._store import WellIndex
+from figs._resample import downsample, x_range_from_relayout
+from figs._serialize import loads
+from figs._arrays import decode_typed_arrays
 import json
 from pathlib import Path
 import plotly.io as pio
@@ -35,14 +40,21 @@ figure_bgcolor = '#222222'
 default_dragmode = 'pan'
 trace_drawingmode = 'lines'
 savefile_name = 'sample.json'
+max_points = 2000  # most points per trace in the visible range, re-aggregated from wls_index on zoom
 config = dict({'scrollZoom': True,
                'displaylogo': False,
                'autosizable':True,
                'responsive': True,
                })
 #  Define the Water Level DataFrame to plot from
-wls_df = pd.read_excel(Path.home() / 'Python/data/Tehaleh_wls.xlsx', sheet_name='WellDD')
-wls_df = wls_df.set_index('Date Time')
+wls_df = ExcelDateData(
+    Path.home() / 'Python/data/Tehaleh_wls.xlsx',
+    date_label='date time',
+    sheet_name='WellDD',
+    dtype='float32',
+).get_idx(0)
+#  per-well index of the non-null records, so selections don't scan the whole frame
+wls_index = WellIndex(wls_df)
 
 def render(app: Dash) -> dcc.Graph:
     
@@ -52,22 +64,55 @@ def render(app: Dash) -> dcc.Graph:
         Output(ids.WATER_LEVELS, 'figure'),
         Input(ids.OPEN_FIG, 'contents'),
         Input(ids.WATER_LEVELS, 'clickData'),
+        Input(ids.WATER_LEVELS, 'relayoutData'),
         State(ids.WATER_LEVELS, 'figure'),
+        State(ids.OPEN_FIG, 'filename'),
         prevent_initial_call=True)
-    def update_wl_fig(upload_contents, clickData, fig_state):
+    def update_wl_fig(upload_contents, clickData, relayout_data, fig_state, upload_filename):
         if callback_context.triggered_id == ids.OPEN_FIG:
-            """file to open must be a json representation of a Plotly fig"""
+            """file to open must be a json representation of a Plotly fig, or a fig saved with Fig.save (*.figz)"""
             # Split the content into metadata and data itself
             content_type, content_string = upload_contents.split(',')
             # Decode the base64 string
             decoded = base64.b64decode(content_string)
-            json_fig = json.loads(decoded)
-            fig_to_open = go.Figure(json_fig)
+            if upload_filename and upload_filename.endswith('.figz'):
+                return Fig.load(decoded)
+            json_fig = loads(decoded)
+            fig_to_open = go.Figure(decode_typed_arrays(json_fig))
             return fig_to_open
+        if callback_context.triggered_prop_ids.get(f'{ids.WATER_LEVELS}.relayoutData'):
+            x_range = x_range_from_relayout(relayout_data)
+            if x_range is False:
+                raise PreventUpdate
+            start, end = (None, None) if x_range is None else x_range
+            zoomed_fig = go.Figure(decode_typed_arrays(fig_state))
+            with zoomed_fig.batch_update():
+                for trace in zoomed_fig.data:
+                    if trace.name in wls_index:
+                        dates, levels = wls_index.get(trace.name, start=start, end=end)
+                        trace.x, trace.y = downsample(dates, levels, max_points)
+                #  keep the user's zoom when the re-aggregated figure is sent back
+                zoomed_fig.update_layout(uirevision='water levels')
+            return zoomed_fig
         if callback_context.triggered_id == ids.WATER_LEVELS:
             curve_number = clickData['points'][0]['curveNumber']
             return
 
+    @app.callback(
+        Output(ids.SAVE_FIG, 'data'),
+        Input(ids.SAVE_FIG_NONRESAMPLED, 'n_clicks'),
+        State(ids.WATER_LEVELS, 'figure'),
+        prevent_initial_call=True
+    )
+    def save_nonresampled(_, fig_state):
+        """save the figure with the full resolution record of every well trace, not the resampled view"""
+        full_fig = go.Figure(decode_typed_arrays(fig_state))
+        with full_fig.batch_update():
+            for trace in full_fig.data:
+                if trace.name in wls_index:
+                    trace.x, trace.y = wls_index.get(trace.name)
+        return dcc.send_string(full_fig.to_json(), savefile_name)
+
     @app.callback(
         Output(ids.DATA_RETURN, 'children'),
         Input(ids.WATER_LEVELS, 'clickData'),
@@ -93,15 +138,14 @@ def render(app: Dash) -> dcc.Graph:
         selected_points = []
         for point in selected_data['points']:
             selected_points.append(point['text'])
-        columns = wls_df.columns
         wl_fig = Fig()
         wl_fig_bokeh = BokehFig(x_axis_type="datetime")
-        wldd_source = wl_fig_bokeh.column_data_source(wls_df)
         for point_name in selected_points:
-            if point_name in columns:
-                well_data = wls_df.loc[:, point_name].dropna()
-                wl_fig.add_scattergl(x=well_data.index, y=well_data, name=point_name, connectgaps=False)
-                wl_fig_bokeh.line(x='Date Time', legend_label=point_name, y=point_name, source=wldd_source)
+            if point_name in wls_index:
+                dates, levels = wls_index.get(point_name)
+                wl_fig.add_scattergl(x=dates, y=levels, name=point_name, connectgaps=False)
+                well_source = wl_fig_bokeh.column_data_source(data={'Date Time': dates, point_name: levels})
+                wl_fig_bokeh.line(x='Date Time', legend_label=point_name, y=point_name, source=well_source)
         wl_fig.show()
         # wl_fig_bokeh.show()
 
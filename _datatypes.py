@@ -1,7 +1,8 @@
+from itertools import chain
 from pathlib import Path
 import pandas as pd
-import shapely as shp
 import figs as f
+from figs._cache import ExcelCache
 
 class BaseData:
 
@@ -10,29 +11,251 @@ class BaseData:
         self.name = None
 
 
+def _file_stat(path: Path) -> tuple | None:
+    """size and mtime of a file, None if it can't be read"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def read_file(path: Path, reader=pd.read_excel, cache: ExcelCache = None, **read_kwargs) -> pd.DataFrame:
+    """
+    Parse a file into a DataFrame, through the cache if one is given. Module level so it can be sent to
+    worker processes.
+    """
+    if cache is None:
+        return reader(path, **read_kwargs)
+    return cache.read(path, reader, **read_kwargs)
+
+
+def _downcast(df: pd.DataFrame, dtype: str, skip: list = None) -> pd.DataFrame:
+    """cast the numeric columns of df to dtype in place, leaving the columns in skip alone"""
+    skip = [] if skip is None else skip
+    numeric_cols = [col for col in df.columns if col not in skip and df[col].dtype.kind in 'fiu']
+    if numeric_cols:
+        df[numeric_cols] = df[numeric_cols].astype(dtype)
+    return df
+
+
+def read_excel_selected(
+        path: Path,
+        sheet_name: str | int = 0,
+        columns: list = None,
+        date_label: str = None,
+        dtype: str = None,
+) -> pd.DataFrame:
+    """
+    Read one sheet of an excel file, only building the columns in the columns allow-list.
+    :param path: Path to the excel file
+    :param sheet_name: name or index of the sheet to read
+    :param columns: column names to load, None loads every column. The date column (if date_label is given) is
+    always loaded
+    :param date_label: lowercase label to identify the date column
+    :param dtype: dtype for the numeric columns, None keeps pandas' default
+    """
+    usecols = None
+    if columns is not None:
+        keep = set(columns)
+
+        def usecols(col):
+            return col in keep or (date_label is not None and date_label in str(col).lower())
+
+    df = pd.read_excel(path, sheet_name=sheet_name, usecols=usecols)
+    if dtype is not None:
+        date_cols = [col for col in df.columns if date_label is not None and date_label in str(col).lower()]
+        _downcast(df, dtype, skip=date_cols)
+    return df
+
+
+def _infer_sep(path: Path) -> str:
+    """tab separated for .tsv and .txt logger exports, comma separated otherwise"""
+    return '\t' if path.suffix.lower() in ('.tsv', '.txt') else ','
+
+
+def iter_csv_chunks(
+        path: Path,
+        date_label: str = 'date',
+        sep: str = None,
+        chunksize: int = 500_000,
+        dtype: str = 'float32',
+        columns: list = None,
+        offset: int = 0,
+        **read_kwargs
+):
+    """
+    Generator of DataFrame chunks from a csv/tsv file. The first column with date_label in its lowercase name is
+    parsed to datetime while reading and numeric columns are downcast to dtype, so only one chunk at full
+    precision is ever held in memory.
+    :param path: Path to the csv/tsv file
+    :param date_label: lowercase label to identify the date column
+    :param sep: column separator, inferred from the file suffix if None
+    :param chunksize: number of rows per chunk
+    :param dtype: dtype for the numeric columns, None keeps pandas' default
+    :param columns: column names to load, None loads every column. The date column is always loaded
+    :param offset: byte offset to start reading from. Reading starts at the beginning of the line the offset falls
+    in, so rows are never split
+    :param read_kwargs: other keyword arguments passed to pd.read_csv
+    """
+    sep = _infer_sep(path) if sep is None else sep
+    header = pd.read_csv(path, sep=sep, nrows=0, **read_kwargs).columns
+    date_cols = [col for col in header if date_label in str(col).lower()][:1]
+    usecols = None
+    if columns is not None:
+        keep = set(columns)
+        usecols = [col for col in header if col in keep or col in date_cols]
+    with open(path, 'rb') as file:
+        start = _line_start(file, offset)
+        if start > 0:
+            if start >= file.seek(0, 2):
+                return
+            file.seek(start)
+            read_kwargs = read_kwargs | {'header': None, 'names': list(header)}
+        with pd.read_csv(
+                file, sep=sep, chunksize=chunksize, parse_dates=date_cols, usecols=usecols, **read_kwargs
+        ) as reader:
+            for chunk in reader:
+                if dtype is not None:
+                    _downcast(chunk, dtype, skip=date_cols)
+                yield chunk
+
+
+def _line_start(file, offset: int, block_size: int = 65536) -> int:
+    """byte position of the start of the line that offset falls in"""
+    position = offset
+    while position > 0:
+        block_start = max(0, position - block_size)
+        file.seek(block_start)
+        block = file.read(position - block_start)
+        newline = block.rfind(b'\n')
+        if newline != -1:
+            return block_start + newline + 1
+        position = block_start
+    return 0
+
+
+def _count_lines(path: Path, offset: int = 0, block_size: int = 1 << 24) -> int:
+    """number of lines in a file from offset on, an upper bound of the number of csv rows there"""
+    lines, last = 0, b'\n'
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        while block := file.read(block_size):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    return lines + (last != b'\n')
+
+
+def _upcast(column, rows: int, values):
+    """
+    column, or a copy of its first rows in a dtype that also holds values when they don't fit: the common numeric
+    dtype of both, otherwise object, such as a date column with an unparseable timestamp further down the file
+    """
+    import numpy as np
+    if values.dtype == column.dtype or column.dtype == object:
+        return column
+    if column.dtype.kind in 'biuf' and values.dtype.kind in 'biuf':
+        return column.astype(np.result_type(column.dtype, values.dtype))
+    upcast = np.empty(len(column), dtype=object)
+    #  through pandas so dates become Timestamps instead of integer nanoseconds
+    upcast[:rows] = pd.Series(column[:rows]).to_numpy(dtype=object)
+    return upcast
+
+
+def read_csv_chunked(path: Path, **kwargs) -> pd.DataFrame:
+    """
+    Read a whole csv/tsv file with iter_csv_chunks into one DataFrame. When the numeric columns are downcast (dtype
+    is not None), each chunk is copied into output arrays preallocated from a count of the file's lines, so peak
+    memory is the final DataFrame plus one chunk. The other columns are typed from the first chunk and upcast
+    (see _upcast) when a later chunk doesn't fit, such as dates with an unparseable value. With dtype None the
+    chunks are concatenated, which holds every chunk and the joined DataFrame at once; stream large files with
+    iter_csv_chunks instead.
+    :param path: Path to the csv/tsv file
+    :param kwargs: keyword arguments passed to iter_csv_chunks
+    """
+    chunks = iter_csv_chunks(path, **kwargs)
+    first = next(chunks, None)
+    if first is None:
+        return pd.DataFrame()
+    dtype = kwargs.get('dtype', 'float32')
+    if dtype is None:
+        return pd.concat([first, *chunks], ignore_index=True)
+    import numpy as np
+    n_rows = _count_lines(path, kwargs.get('offset', 0))
+    numeric = [col for col in first.columns if first[col].dtype == dtype]
+    others = {
+        col: np.empty(n_rows, dtype=first[col].dtype if isinstance(first[col].dtype, np.dtype) else object)
+        for col in first.columns if col not in numeric
+    }
+    #  one 2-D block for the numeric columns, which pandas wraps without copying
+    block = np.empty((n_rows, len(numeric)), dtype=dtype)
+    rows = 0
+    for chunk in chain([first], chunks):
+        stop = rows + len(chunk)
+        values = chunk[numeric]
+        if not (values.dtypes == dtype).all():
+            #  a column that was numeric in the first chunk, with text further down
+            values = values.apply(pd.to_numeric, errors='coerce')
+        block[rows:stop] = values.to_numpy(dtype=dtype, na_value=np.nan)
+        for col in others:
+            values = chunk[col].to_numpy()
+            others[col] = _upcast(others[col], rows, values)
+            if others[col].dtype == object:
+                values = chunk[col].to_numpy(dtype=object)
+            others[col][rows:stop] = values
+        rows = stop
+    df = pd.DataFrame(block[:rows], columns=numeric, copy=False)
+    for position, col in enumerate(first.columns):
+        if col in others:
+            df.insert(position, col, others[col][:rows])
+    return df
+
+
 class ExcelData(BaseData):
 
+    reader = staticmethod(read_excel_selected)
+
     def __init__(
             self,
             excel_paths: Path | list = None,
-
+            cache: ExcelCache | bool = True,
+            workers: int | None = 1,
+            sheet_name: str | int = 0,
+            columns: list = None,
+            dtype: str = None,
     ):
         """
         Class to import data from excel files into Pandas DataFrames
         :param excel_paths: Paths to excel files, can give a single Path or a list of Paths
+        :param cache: ExcelCache to read the excel files through. True uses the default cache, False disables caching
+        :param workers: number of worker processes used to parse the excel files. 1 parses them one at a time in
+        this process, None uses every core
+        :param sheet_name: name or index of the sheet to read from each excel file
+        :param columns: allow-list of column names to load, None loads every column
+        :param dtype: dtype for the numeric columns, such as 'float32'. None keeps pandas' default
         """
         super().__init__()
 
         self._excel_dict = None
         self._excel_paths = None
+        self._cache = None
         self.excel_paths = excel_paths
+        self.cache = cache
+        self.workers = workers
+        self.sheet_name = sheet_name
+        self.columns = columns
+        self.dtype = dtype
+        self.errors = {}
 
     @property
     def excel_dict(self):
         if self._excel_dict is None:
             self._excel_dict = {}
-            for excel_path in self.excel_paths:
-                self.add_excel(excel_path)
+            if self.workers == 1 or len(self.excel_paths) < 2:
+                for excel_path in self.excel_paths:
+                    self.add_excel(excel_path)
+            else:
+                self.add_excels(self.excel_paths, workers=self.workers)
         return self._excel_dict
 
     @excel_dict.setter
@@ -50,9 +273,9 @@ class ExcelData(BaseData):
     @excel_paths.setter
     def excel_paths(self, val):
         if val is None:
-            self._excel_paths = []
+            val = []
         if isinstance(val, list):
-            for item in list:
+            for item in val:
                 assert isinstance(item, Path), 'excel paths provided must be Path objects'
         elif isinstance(val, Path):
             val = [val]
@@ -60,17 +283,106 @@ class ExcelData(BaseData):
             raise TypeError('excel_paths must be a list or a Path object')
         self._excel_paths = val
 
+    @property
+    def cache(self):
+        """ExcelCache the excel files are read through, None if caching is disabled"""
+        return self._cache
+
+    @cache.setter
+    def cache(self, val):
+        if val is True:
+            val = ExcelCache()
+        elif val is False:
+            val = None
+        if val is not None:
+            assert isinstance(val, ExcelCache), 'cache must be an ExcelCache or bool'
+        self._cache = val
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @workers.setter
+    def workers(self, val):
+        if val is not None:
+            assert isinstance(val, int) and val > 0, 'workers must be a positive int or None'
+        self._workers = val
+
+    @property
+    def columns(self):
+        """allow-list of column names to load, None loads every column"""
+        return self._columns
+
+    @columns.setter
+    def columns(self, val):
+        if val is not None:
+            assert isinstance(val, list | tuple), 'columns must be a list of column names'
+            val = list(val)
+        self._columns = val
+
+    @property
+    def read_kwargs(self) -> dict:
+        """keyword arguments passed to the reader for every file"""
+        return {
+            'sheet_name': self.sheet_name,
+            'columns': self.columns,
+            'dtype': self.dtype,
+        }
+
+    def read_excel(self, excel_path: Path) -> pd.DataFrame:
+        """Method to parse an excel file into a DataFrame, through the cache if there is one"""
+        return read_file(excel_path, self.reader, self.cache, **self.read_kwargs)
+
+    def _add_entry(self, excel_path: Path, df: pd.DataFrame = None, error: Exception = None, stat: tuple = None):
+        """
+        add a parsed DataFrame to the excel_dict, or record why the file could not be read. stat is the size and
+        mtime of the file taken before it was read, used to tell if the file has grown since.
+        """
+        if error is not None:
+            print(f"can't read excel file: {excel_path} ({error!r})")
+            self.errors[excel_path.name] = error
+            return
+        self.errors.pop(excel_path.name, None)
+        self.excel_dict.update({excel_path.name: {
+            'Path': excel_path,
+            'DataFrame': df,
+            'Stat': stat}
+        })
+
     def add_excel(self, excel_path: Path):
         """Method to add a DataFrame from an excel file Path object to the excel_dict"""
         assert isinstance(excel_path, Path), 'excel_path must be a Path object'
+        stat = _file_stat(excel_path)
         try:
-            pd_excel = pd.read_excel(excel_path)
-        except ValueError:
-            print(f"can't read excel file: {excel_path}")
-        self.excel_dict.update({excel_path.name: {
-            'Path': excel_path,
-            'DataFrame': pd_excel}
-        })
+            pd_excel = self.read_excel(excel_path)
+        except Exception as error:
+            self._add_entry(excel_path, error=error)
+            return
+        self._add_entry(excel_path, pd_excel, stat=stat)
+
+    def add_excels(self, excel_paths: list, workers: int | None = None):
+        """
+        Method to parse several excel files in a process pool and add them to the excel_dict. Entries are added
+        in the order of excel_paths regardless of which file finishes first. Files that fail are reported in
+        the errors dict instead of stopping the others.
+        :param excel_paths: list of Paths to excel files
+        :param workers: number of worker processes, None uses every core
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        for excel_path in excel_paths:
+            assert isinstance(excel_path, Path), 'excel_path must be a Path object'
+        stats = [_file_stat(excel_path) for excel_path in excel_paths]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(read_file, excel_path, self.reader, self.cache, **self.read_kwargs)
+                for excel_path in excel_paths
+            ]
+            for excel_path, stat, future in zip(excel_paths, stats, futures):
+                error = future.exception()
+                if error is not None:
+                    self._add_entry(excel_path, error=error)
+                else:
+                    self._add_entry(excel_path, future.result(), stat=stat)
 
     def get_idx(self, idx=None):
         """Method to get a DataFrame of an excel file based on its index in the excel_dict"""
@@ -90,9 +402,21 @@ class ExcelDateData(ExcelData):
             self,
             excel_paths: Path | list = None,
             date_label: str = 'date',
-            auto_date_to_index: bool = True
+            auto_date_to_index: bool = True,
+            cache: ExcelCache | bool = True,
+            workers: int | None = 1,
+            sheet_name: str | int = 0,
+            columns: list = None,
+            dtype: str = None,
     ):
-        super().__init__(excel_paths=excel_paths)
+        super().__init__(
+            excel_paths=excel_paths,
+            cache=cache,
+            workers=workers,
+            sheet_name=sheet_name,
+            columns=columns,
+            dtype=dtype,
+        )
         self.date_label = date_label
         self.auto_date_to_index = auto_date_to_index
 
@@ -105,9 +429,66 @@ class ExcelDateData(ExcelData):
         for name, excel in self.excel_dict.items():
             df = excel['DataFrame']
             for col in list(df.columns):
-                if self.date_label in str.lower(col):
+                if date_label in str.lower(str(col)):
                     df.set_index(col, inplace=True)
-                    return
+                    break
+            if pd.api.types.is_datetime64_any_dtype(df.index) and len(df.index):
+                excel['Last'] = df.index.max()
+
+    def read_tail(self, excel: dict) -> pd.DataFrame:
+        """
+        read the rows of an excel_dict entry's file that are newer than the last loaded timestamp. Goes through the
+        cache, so a file another process already cached is filtered in its columnar form. A workbook can't be read
+        from an offset, so if it changed since it was cached the whole file is parsed (and cached) again.
+        :param excel: entry of the excel_dict
+        :return: DataFrame of the new rows indexed by date
+        """
+        df = excel['DataFrame']
+        if self.cache is None:
+            tail = self.reader(excel['Path'], **self.read_kwargs)
+            tail = tail[tail[df.index.name] > excel['Last']]
+        else:
+            tail = self.cache.read_after(
+                excel['Path'], df.index.name, excel['Last'], self.reader, **self.read_kwargs
+            )
+        return tail.set_index(df.index.name)
+
+    def refresh(self) -> dict:
+        """
+        Incrementally reload the files that changed since they were loaded. Only rows newer than the last
+        timestamp loaded from each file are appended to its DataFrame and reported, so figures only extend their
+        traces. Reading the new rows is only incremental for csv/tsv files (CsvDateData reads the appended bytes).
+        Any change to an excel workbook changes its content hash, so the workbook is parsed and cached again in
+        full before its new rows are picked out.
+        :return: dict where keys are the names of the columns (traces) that grew and values are Series of their
+        new rows, can be passed to Fig.extend_water_levels or Subplot.extend_water_levels
+        """
+        grown = {}
+        for name, excel in self.excel_dict.items():
+            stat = _file_stat(excel['Path'])
+            if stat is None or stat == excel.get('Stat') or excel.get('Last') is None:
+                continue
+            try:
+                tail = self.read_tail(excel)
+            except Exception as error:
+                print(f"can't refresh excel file: {excel['Path']} ({error!r})")
+                self.errors[name] = error
+                continue
+            excel['Stat'] = stat
+            if tail.empty:
+                continue
+            excel['DataFrame'] = pd.concat([excel['DataFrame'], tail])
+            excel['Last'] = excel['DataFrame'].index.max()
+            for col in tail.columns:
+                new_rows = tail[col].dropna()
+                if not new_rows.empty:
+                    grown[col] = new_rows
+        return grown
+
+    @property
+    def read_kwargs(self) -> dict:
+        """keyword arguments passed to the reader, the date column is always kept when selecting columns"""
+        return super().read_kwargs | {'date_label': self.date_label}
 
     def plot(self, idx=0):
         """Method to plot a DataFrame based on its index in the excel_dict"""
@@ -116,3 +497,76 @@ class ExcelDateData(ExcelData):
         for col in df.columns:
             fig.add_scattergl(x=df.index, y=df[col], name=col)
         return fig.show()
+
+
+class CsvDateData(ExcelDateData):
+    """
+    Sibling of ExcelDateData for raw logger csv/tsv exports. Files are streamed in chunks with the date column
+    parsed and the values downcast while reading, so files larger than Excel's row limit can be loaded without
+    converting them first.
+    """
+
+    reader = staticmethod(read_csv_chunked)
+
+    def __init__(
+            self,
+            csv_paths: Path | list = None,
+            date_label: str = 'date',
+            auto_date_to_index: bool = True,
+            sep: str = None,
+            chunksize: int = 500_000,
+            dtype: str = 'float32',
+            columns: list = None,
+            cache: ExcelCache | bool = True,
+            workers: int | None = 1,
+    ):
+        """
+        :param csv_paths: Paths to csv/tsv files, can give a single Path or a list of Paths
+        :param date_label: lowercase label to identify the date column
+        :param auto_date_to_index: set the date column to the index after loading
+        :param sep: column separator, inferred from each file suffix if None
+        :param chunksize: number of rows parsed at a time
+        :param dtype: dtype for the numeric columns, None keeps pandas' default
+        :param columns: allow-list of column names to load, None loads every column
+        :param cache: ExcelCache to read the files through. True uses the default cache, False disables caching
+        :param workers: number of worker processes used to parse the files, None uses every core
+        """
+        self.sep = sep
+        self.chunksize = chunksize
+        super().__init__(
+            excel_paths=csv_paths,
+            date_label=date_label,
+            auto_date_to_index=auto_date_to_index,
+            cache=cache,
+            workers=workers,
+            columns=columns,
+            dtype=dtype,
+        )
+
+    def read_tail(self, excel: dict) -> pd.DataFrame:
+        """read only the bytes appended to an entry's file since it was loaded, then drop rows already loaded"""
+        df = excel['DataFrame']
+        offset = excel['Stat'][0] if excel.get('Stat') is not None else 0
+        tail = read_csv_chunked(excel['Path'], offset=offset, **self.read_kwargs)
+        if tail.empty:
+            return tail
+        tail = tail[tail[df.index.name] > excel['Last']]
+        return tail.set_index(df.index.name)
+
+    @property
+    def csv_paths(self):
+        return self.excel_paths
+
+    @csv_paths.setter
+    def csv_paths(self, val):
+        self.excel_paths = val
+
+    @property
+    def read_kwargs(self) -> dict:
+        return {
+            'date_label': self.date_label,
+            'sep': self.sep,
+            'chunksize': self.chunksize,
+            'dtype': self.dtype,
+            'columns': self.columns,
+        }
@@ -0,0 +1,191 @@
+"""
+Warm, reusable static image export workers. Each worker is a long-lived process that imports plotly's image export
+engine and renders a throwaway figure once when it starts, then serves export requests over a pipe, so repeated
+exports (such as the several SVG renders of a scaled PDF) only pay for rendering and not for engine startup.
+
+Exports render in the calling process by default, since kaleido already keeps its own export subprocess. Batch
+callers opt into the warm workers with use_export_worker() or an ExportPool. Workers are started with the spawn
+method, so scripts that use them need the usual `if __name__ == "__main__":` guard.
+"""
+import atexit
+import multiprocessing as mp
+import queue
+import threading
+import traceback
+
+
+def _serve(conn):
+    """worker loop: answer (fig_dict, to_image kwargs) requests with (image bytes, error) until sent None"""
+    import plotly.io as pio
+    try:
+        #  newer kaleido versions keep one browser open for every export when the sync server is started
+        import kaleido
+        kaleido.start_sync_server(silence_warnings=True)
+    except (ImportError, AttributeError, TypeError):
+        pass
+    try:
+        pio.to_image({'data': [], 'layout': {}}, format='svg', width=10, height=10, validate=False)
+    except Exception:
+        pass
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        fig_dict, kwargs = request
+        try:
+            conn.send((pio.to_image(fig_dict, validate=False, **kwargs), None))
+        except Exception:
+            conn.send((None, traceback.format_exc()))
+    conn.close()
+
+
+def _fig_dict(fig) -> dict:
+    """figure dict with raw numpy arrays, which pickle to the worker faster than json"""
+    import plotly.graph_objects as go
+    if isinstance(fig, dict):
+        return fig
+    return go.Figure.to_plotly_json(fig)
+
+
+class ExportWorker:
+    """
+    One warm export process.
+
+    Simple Example:
+
+        worker = ExportWorker()
+        svg = worker.to_image(fig, format='svg', width=1224, height=792)
+        worker.close()
+    """
+
+    def __init__(self):
+        context = mp.get_context('spawn')
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child_conn,), daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self):
+        return self._process.is_alive()
+
+    def to_image(self, fig, format='svg', width=None, height=None, scale=None) -> bytes:
+        """
+        Render a figure in the worker process
+        :param fig: plotly figure or figure dict
+        :param format: 'svg', 'pdf', 'png', ...
+        :param width: width of the image in pixels (points for svg and pdf)
+        :param height: height of the image in pixels (points for svg and pdf)
+        :param scale: scale factor for raster formats
+        :return: bytes of the image
+        """
+        kwargs = dict(format=format, width=width, height=height, scale=scale)
+        with self._lock:
+            self._conn.send((_fig_dict(fig), kwargs))
+            image, error = self._conn.recv()
+        if error is not None:
+            raise RuntimeError(f'image export failed in the export worker:\n{error}')
+        return image
+
+    def close(self):
+        """stop the worker process"""
+        if self.alive:
+            with self._lock:
+                self._conn.send(None)
+            self._process.join(timeout=5)
+        self._conn.close()
+
+
+class ExportPool:
+    """
+    Several warm export processes. Exports submitted from several threads run in parallel, one per idle worker.
+
+    Simple Example:
+
+        with ExportPool(workers=4) as pool:
+            svgs = pool.map(figs, format='svg', width=1224, height=792)
+    """
+
+    def __init__(self, workers: int = 2):
+        """
+        :param workers: number of export processes
+        """
+        self._workers = [ExportWorker() for i in range(workers)]
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def to_image(self, fig, **kwargs) -> bytes:
+        """render a figure on the next idle worker, see ExportWorker.to_image"""
+        worker = self._idle.get()
+        try:
+            return worker.to_image(fig, **kwargs)
+        finally:
+            self._idle.put(worker)
+
+    def map(self, figs, **kwargs) -> list:
+        """render several figures in parallel, returning the image bytes in the order of figs"""
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(self._workers)) as executor:
+            return list(executor.map(lambda fig: self.to_image(fig, **kwargs), figs))
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+#  worker shared by every export in this process, started on the first export after use_export_worker()
+_shared_worker = None
+#  render export_image on the shared worker instead of in this process
+_use_worker = False
+
+
+def use_export_worker(enabled: bool = True):
+    """
+    Render export_image (and so the SVG and scaled PDF exports of ScalableFigure) on the shared warm export worker
+    instead of in this process. Meant for batch scripts that export many figures; they need the
+    `if __name__ == "__main__":` guard since the worker is spawned.
+    :param enabled: False goes back to rendering in this process and stops the shared worker
+    """
+    global _use_worker, _shared_worker
+    _use_worker = enabled
+    if not enabled and _shared_worker is not None:
+        _shared_worker.close()
+        _shared_worker = None
+
+
+def render_in_process():
+    """
+    Make export_image render in this process, and warm up the export engine. Meant for the initializer of pool
+    processes (such as the workers of figs._book), which are long-lived already and only export.
+    """
+    use_export_worker(False)
+    import plotly.io as pio
+    try:
+        pio.to_image({'data': [], 'layout': {}}, format='svg', width=10, height=10, validate=False)
+    except Exception:
+        pass
+
+
+def get_export_worker() -> ExportWorker:
+    """the shared export worker, started if it isn't running"""
+    global _shared_worker
+    if _shared_worker is None or not _shared_worker.alive:
+        _shared_worker = ExportWorker()
+        atexit.register(_shared_worker.close)
+    return _shared_worker
+
+
+def export_image(fig, format='svg', width=None, height=None, scale=None) -> bytes:
+    """render a figure to image bytes, in this process or on the shared warm export worker, see use_export_worker"""
+    if not _use_worker:
+        import plotly.io as pio
+        return pio.to_image(_fig_dict(fig), format=format, width=width, height=height, scale=scale, validate=False)
+    return get_export_worker().to_image(fig, format=format, width=width, height=height, scale=scale)
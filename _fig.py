@@ -1,27 +1,66 @@
+from __future__ import annotations
 from pathlib import Path
-import pandas as pd
-import shapely as shp
+from types import MappingProxyType
+from typing import TYPE_CHECKING
+import numpy as np
 from plotly import graph_objects as go
-from plotly.subplots import make_subplots
-import geopandas as gpd
 import plotly
-import pickle
 import figs as f
+from figs._resample import Resampler, merge_series, split_series
+from figs._arrays import dates_array, values_array, encode_typed_arrays, encode_regular_x
+from figs._serialize import dumps, save_fig, load_fig_dict
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 data_dir = Path.cwd().joinpath('sample_data')
 
+
+class TraceColors:
+    """Per-figure mapping of trace names to colors, kept out of the shared template so figures don't share it"""
+
+    def __init__(self, color_list=None):
+        """
+        :param color_list: list of eligible colors. Defaults to default plotly color list.
+        """
+        self.default_trace_colors = plotly.colors.DEFAULT_PLOTLY_COLORS if color_list is None else color_list
+        self._trace_colors_dict = {}
+
+    def get(self, names=None, color_list=None) -> dict:
+        """
+        Get color names for each trace being added to a fig.
+        Returns a dictionary of names and colors. Can be used to sync colors between traces
+        with certain names.
+        :param names: iterable with names of traces
+        :param color_list: list of eligible colors. Defaults to default_trace_colors.
+        :return: Dict where keys are names and values are CSS colors
+        """
+        if color_list is None:
+            color_list = self.default_trace_colors
+        if names is None:
+            return self._trace_colors_dict
+        trace_colors_dict = self._trace_colors_dict
+        for idx, name in enumerate(names):
+            if name in trace_colors_dict.keys():
+                continue
+            color = color_list[idx % len(color_list)]
+            trace_colors_dict[name] = color
+        return trace_colors_dict
+
+
 class Template:
     """Base Template for figure objects in the Fig class"""
     def __init__(self):
 
+        self._frozen = False
         # FIG TEMPLATE
         self._config = {
             'scrollZoom': True,
             'displaylogo': False
         }
         self.default_trace_colors = plotly.colors.DEFAULT_PLOTLY_COLORS
-        self._trace_colors_dict = {}
+        self._trace_colors = TraceColors(self.default_trace_colors)
         self._modebar = go.layout.Modebar(
             add=[
                 'togglespikelines',
@@ -62,7 +101,7 @@ class Template:
             margin=self._margin
         )
         self._template = go.layout.Template(layout=self._template_layout)
-        self.layout = go.Layout(template=self._template)
+        self._layout = go.Layout(template=self._template)
         
         # to update subplot layout
         self._template_update_args = {
@@ -98,6 +137,18 @@ class Template:
             },
                 }
         
+    @property
+    def layout(self) -> go.Layout:
+        """layout of the figures built from the template, a copy once the template is frozen"""
+        if self._frozen:
+            #  plotly objects can't be made read-only, so the shared layout is never handed out
+            return go.Layout(self._layout)
+        return self._layout
+
+    @layout.setter
+    def layout(self, val):
+        self._layout = val
+
     def _get_colors_for_traces(self, names=None, color_list=None) -> dict:
         """
         Helper method to get color names for each trace being added to a fig.
@@ -107,18 +158,29 @@ class Template:
         :param color_list: list of eligible colors. Defaults to default plotly color list.
         :return: Dict where keys are names and values are CSS colors
         """
-        if color_list is None:
-            color_list = self.default_trace_colors
-        if names is None:
-            return self._trace_colors_dict
-        trace_colors_dict = self._trace_colors_dict
-        for idx, name in enumerate(names):
-            if name in trace_colors_dict.keys():
-                continue
-            color = color_list[idx % len(color_list)]
-            trace_colors_dict[name] = color
-        return trace_colors_dict
-        
+        if self._trace_colors is None:
+            #  a frozen template keeps no color state, every figure has its own TraceColors
+            return TraceColors(self.default_trace_colors).get(names, color_list)
+        return self._trace_colors.get(names, color_list)
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f'the shared template is frozen, cannot set {name}')
+        super().__setattr__(name, value)
+
+    def freeze(self):
+        """
+        Make the template read-only so it can be shared by every figure. Its layout is built and validated once,
+        attributes can't be reassigned and the subplot update args become a read-only mapping. The layout property
+        returns a copy from then on, so changing it in place can't leak into other figures. The mutable trace
+        color state is dropped, figures built from the template each get their own TraceColors.
+        """
+        self._template_update_args = MappingProxyType(self._template_update_args)
+        self._config = MappingProxyType(self._config)
+        self._trace_colors = None
+        self._frozen = True
+        return self
+
     @staticmethod
     def create_hover(name_dict: dict = None):
         """
@@ -126,23 +188,24 @@ class Template:
 
         :args:
         name_dict [dict]: dict where the keys are the names of each hover data label,
-        such as 'Proj #'. The values associated with each dict key are a list of data for that key,
-        such as a list of project numbers, one for each data point in the figure trace
+        such as 'Proj #'. The values associated with each dict key are a list, numpy array or pandas Series of data
+        for that key, such as a list of project numbers, one for each data point in the figure trace
 
-        :return: customdata, hovertemplate
+        :return: customdata, hovertemplate. customdata is a 2-D numpy array with one column per key, a float array if
+        every column is numeric (so it can be sent as a typed array), otherwise an object array
         """
         names = list(name_dict.keys())
-        lists = list(name_dict.values())
-        list_len = len(lists[0])
-        custom_data = []
-        hover_template_list = []
-
-        for i in range(list_len):
-            this_list = [param[i] for param in lists]
-            custom_data.append(this_list)
+        columns = [Template._hover_column(values) for values in name_dict.values()]
+        if all(column.dtype.kind in 'fiub' for column in columns):
+            custom_data = np.column_stack(columns)
+        else:
+            custom_data = np.empty((len(columns[0]), len(columns)), dtype=object)
+            for i, column in enumerate(columns):
+                custom_data[:, i] = column
 
-        for i, name in enumerate(names):
-            if type(custom_data[0][i]) is float:
+        hover_template_list = []
+        for i, (name, column) in enumerate(zip(names, columns)):
+            if column.dtype.kind == 'f':
                 hover_template_list.append(
                     f'<b>{name}: </b>%{{customdata[{i}]:.2f}}<br>'
                 )
@@ -155,22 +218,198 @@ class Template:
 
         return custom_data, hover_template
 
+    @staticmethod
+    def _hover_column(values) -> np.ndarray:
+        """hover data as a 1-D numpy column, without copying numpy arrays or numeric pandas Series. Dates become
+        strings in one vectorized pass, in the form plotly writes dates ('%Y-%m-%d %H:%M:%S', or '%Y-%m-%d' when
+        every date is at midnight). Nullable integers stay integers, or objects with None for missing values, so
+        they aren't formatted as floats"""
+        import pandas as pd
+        dtype = getattr(values, 'dtype', None)
+        if dtype is None:
+            values = np.asarray(values)
+            dtype = values.dtype
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            dates = pd.Series(values)
+            dates = dates.dt.tz_localize(None) if dates.dt.tz is not None else dates
+            at_midnight = (dates.dropna() == dates.dropna().dt.normalize()).all()
+            text = dates.dt.strftime('%Y-%m-%d' if at_midnight else '%Y-%m-%d %H:%M:%S')
+            return text.fillna('').to_numpy(dtype=object)
+        if isinstance(dtype, pd.api.extensions.ExtensionDtype) and dtype.kind in 'iub':
+            if values.isna().any():
+                return values.to_numpy(dtype=object, na_value=None)
+            return values.to_numpy(dtype=dtype.numpy_dtype)
+        return values.to_numpy() if hasattr(values, 'to_numpy') else np.asarray(values)
+
     @staticmethod
     def add_to_hover_dict(existing_hover_dict: dict, dict_to_add: dict):
-        """add key,value pairs from a dict to another dict"""
-        new_hover_dict = existing_hover_dict
+        """
+        Add the columns of dict_to_add (a dict or a DataFrame) to existing_hover_dict, in place. Values are stored
+        as the numpy columns create_hover stacks, so numpy arrays and numeric Series aren't copied and lists are
+        converted once, in one vectorized pass per column.
+        :param existing_hover_dict: dict of hover label to column, None starts a new dict
+        :param dict_to_add: dict of hover label to list, numpy array or pandas Series, or a DataFrame
+        :return: existing_hover_dict with the added columns
+        """
+        new_hover_dict = {} if existing_hover_dict is None else existing_hover_dict
+        length = len(next(iter(new_hover_dict.values()))) if new_hover_dict else None
         for hover_name, hover_data in dict_to_add.items():
-            new_hover_dict[hover_name] = hover_data
+            column = Template._hover_column(hover_data)
+            length = len(column) if length is None else length
+            assert len(column) == length, f'hover column {hover_name} has {len(column)} values, expected {length}'
+            new_hover_dict[hover_name] = column
         return new_hover_dict
 
-template = Template()
+#  shared, frozen template used by every BaseFig, Fig and Subplot
+template = Template().freeze()
+
+
+def extend_traces(fig: go.Figure, grown: dict, resampler: Resampler = None):
+    """
+    Append new rows to the traces of a figure, matching traces by name. Rows of a well merged into a consolidated
+    trace go to that trace. Traces the resampler holds have the rows appended to their full data and are
+    downsampled again to the resampler's last x range, instead of carrying the raw rows.
+    :param fig: figure with the traces to extend
+    :param grown: dict where keys are trace names and values are Series of new rows indexed by date, such as the
+    return value of ExcelDateData.refresh
+    :param resampler: Resampler holding the full data of the resampled traces of fig
+    """
+    with fig.batch_update():
+        for trace in fig.data:
+            wells = (trace.meta or {}).get('wells') if isinstance(trace.meta, dict) else None
+            names = [trace.name] if wells is None else wells
+            if not any(name in grown for name in names):
+                continue
+            if resampler is not None and trace.name in resampler:
+                for name in names:
+                    if name in grown:
+                        resampler.extend(name, grown[name].index.to_numpy(), values_array(grown[name]))
+                trace.update(resampler.trace_data(trace.name, resampler.x_range))
+            elif wells is not None:
+                series = split_series(trace_x(trace), values_array(trace.y), trace.customdata, wells)
+                series = [
+                    (name, np.concatenate([x, grown[name].index.to_numpy()]),
+                     np.concatenate([y, values_array(grown[name])]))
+                    if name in grown else (name, x, y)
+                    for name, x, y in series
+                ]
+                x, y, point_names = merge_series(series)
+                trace.update(x=x, y=y, customdata=point_names)
+            else:
+                new_rows = grown[trace.name]
+                trace.x = np.concatenate([trace_x(trace), new_rows.index.to_numpy()])
+                trace.y = np.concatenate([values_array(trace.y), values_array(new_rows)])
+                trace.x0, trace.dx = None, None
+
+
+def trace_x(trace) -> np.ndarray:
+    """x of a trace as an array, also for traces with x0/dx instead of x"""
+    if trace.x is not None:
+        return dates_array(trace.x)
+    if isinstance(trace.x0, str):
+        x0 = np.datetime64(trace.x0, 'ns')
+        return x0 + (np.arange(len(trace.y)) * trace.dx).astype('timedelta64[ms]')
+    return trace.x0 + np.arange(len(trace.y)) * trace.dx
+
+
+def add_trace_specs(fig: go.Figure, specs: list, row: int = None, col: int = None, secondary_y=None):
+    """
+    Add many traces to a figure in one add_traces call inside a batch_update, so figure-wide bookkeeping and
+    relayout run once instead of once per trace.
+    :param fig: figure to add the traces to
+    :param specs: list of trace dicts with a 'type' key, each validated once when added
+    :param row: subplot row to add every trace to, None for the default axes
+    :param col: subplot column to add every trace to, None for the default axes
+    :param secondary_y: add the traces to the secondary y-axis of the subplot
+    """
+    num_traces = range(len(specs))
+    kwargs = {}
+    if row is not None:
+        kwargs['rows'] = [row for i in num_traces]
+        kwargs['cols'] = [col for i in num_traces]
+    if secondary_y is not None:
+        kwargs['secondary_ys'] = [secondary_y for i in num_traces]
+    with fig.batch_update():
+        fig.add_traces(specs, **kwargs)
+
+
+def group_series(series: list, groups) -> dict:
+    """
+    Split (name, x, y) series into groups
+    :param series: list of (name, x, y) tuples
+    :param groups: number of groups to split the series into, in order, or dict of series name to group name
+    :return: dict of group name to the list of (name, x, y) in the group
+    """
+    if isinstance(groups, int):
+        size = -(-len(series) // max(groups, 1))
+        group_of = {name: f'wells {i // size + 1}' for i, (name, _, _) in enumerate(series)}
+    else:
+        group_of = {name: groups.get(name, 'other wells') for name, _, _ in series}
+    members = {}
+    for name, x, y in series:
+        members.setdefault(group_of[name], []).append((name, x, y))
+    return members
+
+
+def consolidate_series(series: list, groups) -> dict:
+    """
+    Merge (name, x, y) series into one line per group, with a NaN separator between series so each series is
+    still drawn as its own line.
+    :param series: list of (name, x, y) tuples
+    :param groups: number of groups to split the series into, in order, or dict of series name to group name
+    :return: dict of group name to (x, y, names, members), where names is the series name of each point and members
+    is the list of series names in the group
+    """
+    return {
+        group: (*merge_series(group_series), [name for name, _, _ in group_series])
+        for group, group_series in group_series(series, groups).items()
+    }
+
+
+def consolidated_specs(
+        series: list, groups, trace_colors: dict, line_width=1.5, resampler: Resampler = None, **kwargs
+) -> list:
+    """
+    Trace specs of water level series merged into a few traces (see consolidate_series). Each trace is one
+    legend entry and legendgroup that toggles every well in it, and the hover shows the well of each point. The
+    wells of a trace are kept in its meta, so extend_traces can route new rows to it. With a resampler, the full
+    data of every well is kept there and the trace carries its downsampled data.
+    """
+    specs = []
+    for group, members in group_series(series, groups).items():
+        names = [name for name, _, _ in members]
+        trace_name = f'{group} ({len(members)} wells)'
+        if resampler is not None:
+            data = resampler.add_group(trace_name, members)
+        else:
+            x, y, point_names = merge_series(members)
+            data = {'x': x, 'y': y, 'customdata': point_names}
+        specs.append(dict(
+            type='scattergl',
+            **data,
+            name=trace_name,
+            legendgroup=group,
+            meta={'wells': names},
+            hovertemplate='<b>%{customdata}</b><br>%{x}<br>%{y:.2f}<extra></extra>',
+            connectgaps=False,
+            line_width=line_width,
+            line_color=trace_colors[names[0]],
+            **kwargs
+        ))
+    return specs
+
 
 class BaseFig(go.Figure):
     """Simple base figure class. Inherits from plotly.graph_objs.Figure."""
     
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.layout = template.layout
+        if not args and 'data' not in kwargs and 'layout' not in kwargs:
+            #  passing the shared layout to the constructor means plotly's default template is never built. The
+            #  constructor copies it, so the frozen template's own layout is read without making an extra copy
+            super().__init__(layout=template._layout, **kwargs)
+        else:
+            super().__init__(*args, **kwargs)
+            self.update_layout(template=template._layout.template)
         self._config = {
             'scrollZoom': True,
             'displaylogo': False
@@ -181,14 +420,53 @@ class BaseFig(go.Figure):
             config=self._config
         super().show(renderer=renderer, config=config, *args, **kwargs)
 
+    def to_plotly_json(self):
+        """
+        figure dict with numpy trace arrays as base64 typed arrays, used when Dash serializes the figure. plotly.py
+        before 6 can't rebuild a figure from this dict, decode it first with figs._arrays.decode_typed_arrays
+        """
+        return encode_typed_arrays(super().to_plotly_json())
+
+    def to_json(self, *args, typed_arrays=False, **kwargs):
+        """
+        JSON string of the figure, as plotly writes it. With typed_arrays, numpy trace arrays are written as base64
+        typed arrays, with orjson when it's installed, which plotly.py before 6 can't read back without
+        figs._arrays.decode_typed_arrays. Other args are passed to plotly.io.to_json.
+        """
+        if not typed_arrays:
+            return super().to_json(*args, **kwargs)
+        if not args and not kwargs:
+            return dumps(self.to_plotly_json())
+        import plotly.io as pio
+        kwargs.setdefault('validate', False)
+        return pio.to_json(self.to_plotly_json(), *args, **kwargs)
+
+    def save(self, file, compress: bool = False):
+        """
+        Save the figure in a compact format, the layout as json and every trace array as a numpy buffer in one npz
+        archive. Much faster to write and read than plotly json, and about as fast as pickle. Open with load.
+        :param file: Path or writable binary file object
+        :param compress: zip-compress the archive, which makes it smaller but slower to write and read than pickle
+        """
+        save_fig(self, file, compress=compress)
+
+    @classmethod
+    def load(cls, file):
+        """
+        Load a figure written by save
+        :param file: Path, readable binary file object, or the bytes of a saved figure
+        """
+        fig_dict = load_fig_dict(file)
+        return cls(data=fig_dict.get('data'), layout=fig_dict.get('layout'))
+
 class Fig(BaseFig):
     """Use this to instantiate figures."""
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._subplot = None
-        self.update_layout(template.layout)
-        self._template = Template()
+        self._resampler = None
+        self._trace_colors = TraceColors(template.default_trace_colors)
 
     def subplot(self, *args, **kwargs):
         self._subplot = Subplot(*args, **kwargs)
@@ -202,39 +480,92 @@ class Fig(BaseFig):
             row (int): row of subplot to add to
             col (int): column of subplot to add to
         """
-        num_traces = range(len(self.data))
-        subplot_fig.add_traces(
-            list(self.data),
-            rows=[row for i in num_traces],
-            cols=[col for i in num_traces]
-        )
+        add_trace_specs(subplot_fig, [trace.to_plotly_json() for trace in self.data], row=row, col=col)
 
     def add_water_levels(
             self,
             df: pd.DataFrame=None,
             secondary_y=None,
+            store=None,
+            wells: list = None,
+            start=None,
+            end=None,
+            max_points: int = None,
+            resample_method: str = 'minmax',
+            consolidate=None,
+            regular_x: bool = False,
             **kwargs
     ):
-        trace_names = df.columns[1:]
-        trace_colors = self._template._get_colors_for_traces(trace_names)
-        for idx, loc in enumerate(trace_names):
-            self.add_trace(
-                go.Scattergl(
-                    x=list(df.iloc[:, 0]),
-                    y=list(df.iloc[:, idx+1]),
-                    name=loc,
+        """
+        Add water level traces from a DataFrame, where the first column is the date and the other columns are
+        wells, or from a WaterLevelStore. When plotting from a store only the wells asked for, between start and end,
+        are read from the memory-mapped arrays. With max_points, each trace carries at most max_points points
+        ('minmax' or 'lttb' resample_method) and the full data is kept for resample and nonresampled.
+        With consolidate, a number of traces or a dict of well name to group name, the wells are merged into that
+        many traces (one legend entry each) instead of one trace per well, which keeps large networks fast to draw.
+        Consolidated traces are resampled too, their wells sharing the max_points budget of the trace. With
+        regular_x, wells logged at a fixed interval are sent as x0/dx instead of an explicit date array, their gaps
+        filled with NaN (see encode_regular_x), unless the traces are resampled or consolidated.
+        """
+        if store is not None:
+            wells = store.wells if wells is None else wells
+            series = [(well, *store.get(well, start=start, end=end)) for well in wells]
+        else:
+            x = dates_array(df.iloc[:, 0])
+            series = [
+                (loc, x, values_array(df.iloc[:, idx+1]))
+                for idx, loc in enumerate(df.columns[1:])
+            ]
+        trace_colors = self._trace_colors.get([name for name, _, _ in series])
+        if max_points is not None:
+            self._resampler = Resampler(max_points, resample_method) if self._resampler is None else self._resampler
+        if consolidate is not None:
+            specs = consolidated_specs(
+                series, consolidate, trace_colors, line_width=1.5,
+                resampler=self._resampler if max_points is not None else None, **kwargs
+            )
+        else:
+            if max_points is not None:
+                series = [(name, *self._resampler.add(name, x, y)) for name, x, y in series]
+            specs = [
+                dict(
+                    type='scattergl',
+                    x=x,
+                    y=y,
+                    name=name,
                     line_width = 1.5,
-                    line_color = trace_colors[loc],
-                    marker_color = trace_colors[loc],
+                    line_color = trace_colors[name],
+                    marker_color = trace_colors[name],
                     **kwargs
-                ),
-                secondary_y=secondary_y,
+                )
+                for name, x, y in series
+            ]
+            if regular_x and max_points is None:
+                specs = encode_regular_x(specs)
+        with self.batch_update():
+            add_trace_specs(self, specs, secondary_y=secondary_y)
+            if any(isinstance(spec.get('x0'), str) for spec in specs):
+                self.update_xaxes(type='date')
+            self.update_yaxes(
+                title_text="Elevation (ft)",
+                showticklabels=True,
+                automargin=True,
             )
-        self.update_yaxes(
-            title_text="Elevation (ft)",
-            showticklabels=True,
-            automargin=True,
-        )
+
+    def extend_water_levels(self, grown: dict):
+        """append new rows to the water level traces, such as the return value of ExcelDateData.refresh"""
+        extend_traces(self, grown, self._resampler)
+
+    def resample(self, x_range=None):
+        """re-aggregate the resampled traces to the x_range (start, end), None for the full range"""
+        if self._resampler is not None:
+            self._resampler.resample(self, x_range)
+
+    def nonresampled(self) -> go.Figure:
+        """copy of the figure with the full resolution data in every resampled trace, for saving"""
+        if self._resampler is None:
+            return go.Figure(self)
+        return self._resampler.nonresampled(self)
         
 class Subplot:
     """
@@ -267,6 +598,9 @@ class Subplot:
         self._col_widths = None
         self._row_heights = None
         self._specs = None
+        self._resampler = None
+        self._map_clusters = None
+        self._trace_colors = TraceColors(template.default_trace_colors)
         self.show_precip = show_precip
         self.show_map = show_map
         self.show_flow = show_flow
@@ -354,6 +688,7 @@ class Subplot:
         vertical_spacing=0.07,
         shared_xaxes=True
         ):        
+        from plotly.subplots import make_subplots
         return make_subplots(
             rows=rows,
             cols=cols,
@@ -364,13 +699,14 @@ class Subplot:
             horizontal_spacing=horizontal_spacing,
             vertical_spacing=vertical_spacing,
             shared_xaxes=shared_xaxes,
+            figure=BaseFig(),
         )
         
     def add_trace(self, *args, **kwargs):
         return self.fig.add_trace(*args, **kwargs)
     
     def show(self, renderer='browser'):
-        self.fig.show(config=template._config, renderer=renderer)
+        self.fig.show(config=dict(template._config), renderer=renderer)
     
     def apply_template_layout(self):
         self.fig.update_layout(**template._template_update_args)
@@ -382,94 +718,180 @@ class Subplot:
             row = 1,
             col = 1,
             secondary_y = None,
+            workers: int | None = 1,
+            store=None,
+            wells: list = None,
+            start=None,
+            end=None,
+            max_points: int = None,
+            resample_method: str = 'minmax',
+            consolidate=None,
+            regular_x: bool = False,
             **kwargs
     ):
         """
-        Add water level data to the main water level subplot. Can provide excel paths or a single DataFrame. The excel
-        paths take presidence over the df if provided.
+        Add water level data to the main water level subplot. Can provide excel paths, a single DataFrame or a
+        WaterLevelStore. The excel paths take presidence over the df, and the df over the store, if provided. With
+        workers other than 1 the excel files are parsed in a process pool (None uses every core). From a store,
+        only the wells asked for between start and end are read from the memory-mapped arrays. With max_points,
+        each trace carries at most max_points points ('minmax' or 'lttb' resample_method) and the full data is kept
+        for resample and nonresampled. With consolidate, a number of traces or a dict of well name to group name,
+        the wells are merged into that many traces, see Fig.add_water_levels. With regular_x, wells logged at a
+        fixed interval are sent as x0/dx instead of an explicit date array, their gaps filled with NaN, unless the
+        traces are resampled or consolidated.
         """
         if excel_paths is not None:
-            data = f.ExcelDateData(excel_paths=excel_paths).dfs
+            data = f.ExcelDateData(excel_paths=excel_paths, workers=workers).dfs
         elif df is not None:
+            import pandas as pd
             df.set_index(df.columns[0], inplace=True)
             assert pd.api.types.is_datetime64_any_dtype(df.index), 'first column of df must be datetime64'
             data = [df]
+        elif store is not None:
+            data = None
         else:
-            raise ValueError('No excel_paths or df data provided')
-        trace_names = []
-        for df in data:
-            names = df.columns.values.tolist()
-            trace_names += names
-        trace_colors = template._get_colors_for_traces(trace_names)
-        for df in data:
-            for col in df.columns:
-                self.add_trace(
-                    go.Scattergl(
-                        x=df.index,
-                        y=df[col],
-                        name=col,
-                        line_width=self.trace_specs['water_levels_width'],
-                        line_color=trace_colors[col],
-                        marker_color=trace_colors[col],
-                        **kwargs
-                    )
-                )
-        """for idx, loc in enumerate(trace_names):
-            self.add_trace(
-                go.Scattergl(
-                    x=list(df.iloc[:, 0]),
-                    y=list(df.iloc[:, idx+1]),
-                    name=loc,
-                    line_width = self.trace_specs['water_levels_width'],
-                    line_color = trace_colors[loc],
-                    marker_color = trace_colors[loc],
+            raise ValueError('No excel_paths, df or store data provided')
+        if data is None:
+            wells = store.wells if wells is None else wells
+            series = [(well, *store.get(well, start=start, end=end)) for well in wells]
+        else:
+            series = []
+            for df in data:
+                x = dates_array(df.index)
+                series.extend((col, x, values_array(df[col])) for col in df.columns)
+        trace_colors = self._trace_colors.get([name for name, _, _ in series])
+        if max_points is not None:
+            self._resampler = Resampler(max_points, resample_method) if self._resampler is None else self._resampler
+        if consolidate is not None:
+            specs = consolidated_specs(
+                series, consolidate, trace_colors, line_width=self.trace_specs['water_levels_width'],
+                resampler=self._resampler if max_points is not None else None, **kwargs
+            )
+        else:
+            if max_points is not None:
+                series = [(name, *self._resampler.add(name, x, y)) for name, x, y in series]
+            specs = [
+                dict(
+                    type='scattergl',
+                    x=x,
+                    y=y,
+                    name=name,
+                    line_width=self.trace_specs['water_levels_width'],
+                    line_color=trace_colors[name],
+                    marker_color=trace_colors[name],
                     **kwargs
-                ),
-                secondary_y=secondary_y,
-                row=row,
-                col=col
-            )"""
-        self.fig.update_yaxes(
-            title_text="Elevation (ft)",
-            showticklabels=True,
-            automargin=True,
-            row=1,
-            col=1)
+                )
+                for name, x, y in series
+            ]
+            if regular_x and max_points is None:
+                specs = encode_regular_x(specs)
+        with self.fig.batch_update():
+            add_trace_specs(self.fig, specs, row=row, col=col, secondary_y=secondary_y)
+            if any(isinstance(spec.get('x0'), str) for spec in specs):
+                self.fig.update_xaxes(type='date')
+            self.fig.update_yaxes(
+                title_text="Elevation (ft)",
+                showticklabels=True,
+                automargin=True,
+                row=1,
+                col=1)
                 
-    def add_precip(self, df: pd.DataFrame=None, row=2, col=1, cols_to_plot=None, type='bars', **kwargs):
+    def extend_water_levels(self, grown: dict):
+        """append new rows to the water level traces, such as the return value of ExcelDateData.refresh"""
+        extend_traces(self.fig, grown, self._resampler)
+
+    def resample(self, x_range=None):
+        """re-aggregate the resampled traces to the x_range (start, end), None for the full range"""
+        if self._resampler is not None:
+            self._resampler.resample(self.fig, x_range)
+
+    def nonresampled(self) -> go.Figure:
+        """copy of the figure with the full resolution data in every resampled trace, for saving"""
+        if self._resampler is None:
+            return go.Figure(self.fig)
+        return self._resampler.nonresampled(self.fig)
+
+    def add_precip(
+            self,
+            df: pd.DataFrame = None,
+            row=2,
+            col=1,
+            cols_to_plot=None,
+            type='bars',
+            agg: str = None,
+            max_bars: int = 5000,
+            water_year_start: int = 10,
+            **kwargs
+    ):
+        """
+        Add precipitation traces from a DataFrame, where the first column is the date and the other columns are
+        gauges.
+        :param df: DataFrame of precipitation
+        :param row: subplot row to add to
+        :param col: subplot column to add to
+        :param cols_to_plot: index of a single column to plot, defaults to every column after the date
+        :param type: 'bars' or 'lines'
+        :param agg: None to plot the raw rows, a period to total over ('D', 'W', 'MS' or 'daily', 'weekly',
+        'monthly', 'yearly'), or 'water_year' for the cumulative total of each water year, which is always a line
+        :param max_bars: above this many bars per trace, bars are drawn as a step line instead, which the browser
+        renders much faster. None to always draw bars
+        :param water_year_start: month the water year starts in, for agg='water_year'
+        """
         if cols_to_plot is None:
             columns = df.columns[1:]
         else:
             columns = df.columns[cols_to_plot:cols_to_plot+1]
-        if len(columns) > 1:
+        if agg is None:
+            x = dates_array(df.iloc[:, 0])
+            values = {loc: values_array(df.loc[:, loc]) for loc in columns}
+        else:
+            from figs._precip import aggregate_precip, CUMULATIVE_AGGS
+            totals = aggregate_precip(df, columns, agg=agg, water_year_start=water_year_start)
+            x = dates_array(totals.index)
+            values = {loc: values_array(totals[loc]) for loc in columns}
+            if agg in CUMULATIVE_AGGS:
+                type = 'lines'
+        step = type == 'bars' and max_bars is not None and len(x) > max_bars
+        if len(columns) > 1 and type == 'bars' and not step:
             self.fig.update_layout(barmode='group')
+        specs = []
         for loc in columns:
-            if type == 'bars':
-                self.add_trace(
-                    go.Bar(
-                        x=list(df.iloc[:, 0]),
-                        y=list(df.loc[:, loc]),
-                        marker_color = self.trace_specs['precip_color'],
-                        name=loc,
-                        **kwargs
-                    ),
-                    row=row,
-                    col=col
-                )
+            if type == 'bars' and not step:
+                specs.append(dict(
+                    type='bar',
+                    x=x,
+                    y=values[loc],
+                    marker_color = self.trace_specs['precip_color'],
+                    name=loc,
+                    **kwargs
+                ))
+            if step:
+                #  too many bars to draw, each bar becomes a step of a filled line instead
+                specs.append(dict(
+                    type='scattergl',
+                    x=x,
+                    y=values[loc],
+                    name=loc,
+                    mode='lines',
+                    line_shape='hv',
+                    fill='tozeroy',
+                    line_color = self.trace_specs['precip_color'],
+                    line_width = self.trace_specs['precip_width'],
+                    **kwargs
+                ))
             if type == 'lines':
-                self.add_trace(
-                    go.Scattergl(
-                        x=list(df.iloc[:, 0]),
-                        y=list(df.loc[:, loc]),
-                        name=loc,
-                        mode='lines',
-                        line_color = self.trace_specs['precip_color'],
-                        line_width = self.trace_specs['precip_width'],
-                        **kwargs
-                    ),
-                    row=row,
-                    col=col
-                )
+                specs.append(dict(
+                    type='scattergl',
+                    x=x,
+                    y=values[loc],
+                    name=loc,
+                    mode='lines',
+                    line_color = self.trace_specs['precip_color'],
+                    line_width = self.trace_specs['precip_width'],
+                    **kwargs
+                ))
+        with self.fig.batch_update():
+            add_trace_specs(self.fig, specs, row=row, col=col)
             self.fig.update_yaxes(
                 title_text="Rainfall (in)",
                 showticklabels=True,
@@ -477,30 +899,80 @@ class Subplot:
                 row=2,
                 col=1
                 )
-                
-    def add_map(self, locs: Path, loc_name_field='ExploName', row=1, col=2):
-        gdf_locs = gpd.read_file(locs)
-        map_center = shp.MultiPoint(gdf_locs.geometry).centroid
-        map_center = dict(
-            lat=map_center.y,
-            lon=map_center.x
-        )
+
+    def add_map(
+            self,
+            locs: Path,
+            loc_name_field='ExploName',
+            row=1,
+            col=2,
+            bbox: tuple = None,
+            max_markers: int = 2000,
+    ):
+        """
+        Add a map of the monitoring locations. Only the name column, and with bbox only the features inside it,
+        are read from the file. Past max_markers locations, the map shows grid clusters precomputed for every zoom
+        level instead of every location; call update_map with the new zoom to expand them.
+        :param locs: Path of a shapefile or GeoPackage of the locations
+        :param loc_name_field: column with the location names
+        :param row: subplot row of the map
+        :param col: subplot column of the map
+        :param bbox: (minx, miny, maxx, maxy) in the coordinates of the file to read, None reads every location
+        :param max_markers: most locations to show as individual markers
+        """
+        from figs._maps import read_locations, center_and_extent, zoom_for_extent, MapClusters
+        lon, lat, names = read_locations(locs, loc_name_field, bbox=bbox)
+        map_center, extent = center_and_extent(lon, lat)
+        zoom = min(zoom_for_extent(extent), 13)
+        if len(lon) > max_markers:
+            self._map_clusters = MapClusters(lon, lat, names)
+            trace_kwargs = self._map_clusters.trace_kwargs(zoom)
+        else:
+            self._map_clusters = None
+            trace_kwargs = dict(
+                lat=lat,
+                lon=lon,
+                mode='markers',
+                text=names,
+                hovertemplate='%{text}<br>Lat: %{lat:.4f}<br>Lon: %{lon:.4f}<extra></extra>',
+                showlegend=False,
+            )
         self.add_trace(
-            go.Scattermapbox(
-            lat=gdf_locs.geometry.y.to_list(),
-            lon=gdf_locs.geometry.x.to_list(),
-            mode='markers',
-            text=gdf_locs.loc[:, loc_name_field],
-            hovertemplate=gdf_locs.loc[:, loc_name_field]+
-                '<br>Lat: %{lat:.4f}<br>'+
-                'Lon: %{lon:.4f}<extra></extra>',
-            showlegend=False,
-            ),
+            go.Scattermapbox(name='map', **trace_kwargs),
             row=row,
             col=col
         )
         self.fig.update_layout(
             mapbox_style="open-street-map",
             mapbox_center=map_center,
-            mapbox_zoom=13,        
+            mapbox_zoom=zoom,
                         )
+
+    def update_map(self, zoom: float, bounds: tuple = None, center: dict = None):
+        """
+        Replace the map markers with the clusters of a zoom level, such as the 'mapbox.zoom' of a Dash relayoutData
+        event. Does nothing if add_map showed every location.
+        :param zoom: map zoom
+        :param bounds: (min lon, min lat, max lon, max lat) of the view. None estimates the view from center and
+        zoom, so a zoomed in map still only gets the clusters around its view instead of every location
+        :param center: dict(lat=, lon=) of the view, such as the 'mapbox.center' of the event. None uses the
+        center of the map's layout
+        """
+        if self._map_clusters is None:
+            return
+        if bounds is None:
+            from figs._maps import view_bounds
+            if center is None:
+                layout_center = self.fig.layout.mapbox.center
+                center = dict(lat=layout_center.lat, lon=layout_center.lon)
+            if center['lat'] is not None and center['lon'] is not None:
+                #  the map's size in pixels isn't known here, so the view is taken generously
+                bounds = view_bounds(center, zoom, width=1024, height=1024)
+        trace_kwargs = self._map_clusters.trace_kwargs(zoom, bounds)
+        self.fig.update_traces(
+            lat=trace_kwargs['lat'],
+            lon=trace_kwargs['lon'],
+            text=trace_kwargs['text'],
+            marker=trace_kwargs['marker'],
+            selector=dict(type='scattermapbox', name='map'),
+        )
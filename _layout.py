@@ -0,0 +1,142 @@
+import numpy as np
+
+#  plotly.js defaults used when neither the layout nor its template set a value
+DEFAULT_MARGIN = {'l': 80, 'r': 80, 't': 100, 'b': 80}
+DEFAULT_FONT_SIZE = 12
+DEFAULT_TICKLEN = 5
+#  average width of a character and height of a line of text, as fractions of the font size
+CHAR_WIDTH = 0.6
+LINE_HEIGHT = 1.3
+#  width of a legend entry besides its text: the symbol, and the padding around it
+LEGEND_SYMBOL_WIDTH = 40
+#  automargin is taken to leave a margin alone while the estimate of the space it needs stays below this fraction
+#  of the margin, closer than that the estimate isn't trusted
+AUTOMARGIN_CLEARANCE = 0.75
+
+
+def layout_value(layout, path: str, default=None):
+    """
+    Value of a layout property such as 'margin.l', from the layout, else from its template, else default
+    :param layout: go.Layout
+    :param path: dotted path of the property
+    :param default: value if neither the layout nor its template set the property
+    """
+    sources = [layout]
+    if layout.template is not None and layout.template.layout is not None:
+        sources.append(layout.template.layout)
+    for source in sources:
+        value = source
+        for key in path.split('.'):
+            value = getattr(value, key, None)
+            if value is None:
+                break
+        if value is not None:
+            return value
+    return default
+
+
+def _axis_values(data, axis_letter: str, axis_ref: str):
+    """the finite values of every trace on an axis, concatenated"""
+    values = []
+    for trace in data:
+        if getattr(trace, f'{axis_letter}axis', axis_ref) not in (axis_ref, None):
+            continue
+        trace_values = getattr(trace, axis_letter, None)
+        if trace_values is None:
+            continue
+        trace_values = np.asarray(trace_values)
+        if trace_values.dtype.kind in 'fiu':
+            values.append(trace_values[np.isfinite(trace_values)])
+    return np.concatenate(values) if values else np.array([])
+
+
+def _tick_label_chars(layout, data, axis: str) -> int:
+    """estimate of the number of characters of the longest tick label of a numeric axis"""
+    axis_range = layout_value(layout, f'{axis}.range')
+    if axis_range is None:
+        values = _axis_values(data, axis[0], axis[0] + axis[5:])
+        if not len(values):
+            return 2
+        axis_range = (values.min(), values.max())
+    return max(len(f'{value:.4g}') for value in axis_range)
+
+
+def _is_date_axis(layout, data, axis: str) -> bool:
+    if layout_value(layout, f'{axis}.type') == 'date':
+        return True
+    return any(
+        getattr(trace, axis[0], None) is not None and np.asarray(getattr(trace, axis[0])).dtype.kind == 'M'
+        for trace in data
+    )
+
+
+def _legend_width(layout, data, font_size) -> float:
+    """estimate of the width of a vertical legend, 0 if there is no legend"""
+    names = [
+        trace.name for trace in data
+        if getattr(trace, 'name', None) is not None and getattr(trace, 'showlegend', None) is not False
+    ]
+    show = layout_value(layout, 'showlegend', len(names) > 1)
+    if not show or not names:
+        return 0
+    return max(len(name) for name in names) * CHAR_WIDTH * font_size + LEGEND_SYMBOL_WIDTH
+
+
+def plot_area(layout, width: float, height: float, data=()) -> dict:
+    """
+    Compute the plot area (the grid of the x and y axes) of a figure on a page without rendering it, from the page
+    size, the margins, the axis domains, and estimates of how far automargin and the legend push the margins.
+    scaleanchor constraints with the default constrain='range' change the axis ranges, not the plot area.
+    The area is exact unless a legend or automargin may push the margins, since those pushes rest on estimates of
+    text sizes. Callers that need the exact area should then measure it from a rendered SVG.
+    :param layout: go.Layout of the figure
+    :param width: page width in points
+    :param height: page height in points
+    :param data: traces of the figure, used to estimate tick label and legend sizes
+    :return: dict with the x and y of the top left corner of the plot area and its width and height, in points,
+    and 'exact', False if the area depends on estimated text sizes
+    """
+    margin = {side: layout_value(layout, f'margin.{side}', default) for side, default in DEFAULT_MARGIN.items()}
+    font_size = layout_value(layout, 'font.size', DEFAULT_FONT_SIZE)
+    autoexpand = layout_value(layout, 'margin.autoexpand', True)
+    exact = True
+
+    if autoexpand and layout_value(layout, 'yaxis.automargin'):
+        tick_font = layout_value(layout, 'yaxis.tickfont.size', font_size)
+        needed = layout_value(layout, 'yaxis.ticklen', DEFAULT_TICKLEN)
+        needed += _tick_label_chars(layout, data, 'yaxis') * CHAR_WIDTH * tick_font
+        if layout_value(layout, 'yaxis.title.text'):
+            needed += layout_value(layout, 'yaxis.title.font.size', font_size) * LINE_HEIGHT + 10
+        exact = exact and needed < AUTOMARGIN_CLEARANCE * margin['l']
+        margin['l'] = max(margin['l'], needed)
+    if autoexpand and layout_value(layout, 'xaxis.automargin'):
+        tick_font = layout_value(layout, 'xaxis.tickfont.size', font_size)
+        lines = 2 if _is_date_axis(layout, data, 'xaxis') else 1
+        needed = layout_value(layout, 'xaxis.ticklen', DEFAULT_TICKLEN) + lines * tick_font * LINE_HEIGHT
+        if layout_value(layout, 'xaxis.title.text'):
+            needed += layout_value(layout, 'xaxis.title.font.size', font_size) * LINE_HEIGHT + 10
+        exact = exact and needed < AUTOMARGIN_CLEARANCE * margin['b']
+        margin['b'] = max(margin['b'], needed)
+
+    legend_width = _legend_width(layout, data, font_size) if autoexpand else 0
+    if legend_width:
+        exact = False
+        legend_x = layout_value(layout, 'legend.x', 1.02)
+        if legend_x >= 1:
+            #  legend to the right of the plot, the right margin grows to fit it
+            margin['r'] = max(margin['r'], legend_width + (legend_x - 1) * (width - margin['l'] - margin['r']))
+        elif legend_x < 0:
+            #  legend to the left, its left edge at legend_x of the plot width must stay on the page
+            margin['l'] = max(margin['l'], -legend_x * (width - margin['r']) / (1 - legend_x))
+
+    x_domain = layout_value(layout, 'xaxis.domain', (0, 1))
+    y_domain = layout_value(layout, 'yaxis.domain', (0, 1))
+    inner_width = width - margin['l'] - margin['r']
+    inner_height = height - margin['t'] - margin['b']
+    return {
+        'x': margin['l'] + x_domain[0] * inner_width,
+        'y': margin['t'] + (1 - y_domain[1]) * inner_height,
+        'width': (x_domain[1] - x_domain[0]) * inner_width,
+        'height': (y_domain[1] - y_domain[0]) * inner_height,
+        'exact': exact,
+    }
@@ -1,4 +1,144 @@
-import plotly.graph_objs as go
+from pathlib import Path
+import numpy as np
 
+#  size in pixels of a map tile, and of the grid cells points are clustered into at each zoom level
+TILE_SIZE = 256
+CELL_SIZE = 48
 
-class BaseMap()
\ No newline at end of file
+
+def read_locations(path: Path, name_field: str, bbox: tuple = None) -> tuple:
+    """
+    Read point locations from a shapefile or GeoPackage, reading only the name column and, with bbox, only the
+    features inside it. Geometries that aren't points are located at their centroids.
+    :param path: Path of the file
+    :param name_field: column holding the location names
+    :param bbox: (minx, miny, maxx, maxy) in the coordinates of the file, None reads every feature
+    :return: lon, lat and name arrays, in WGS84
+    """
+    import geopandas as gpd
+    import shapely
+    try:
+        gdf = gpd.read_file(path, columns=[name_field], bbox=bbox, engine='pyogrio')
+    except (ImportError, ValueError):
+        gdf = gpd.read_file(path, bbox=bbox)
+    if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(4326)
+    geoms = gdf.geometry.values
+    points = np.asarray(geoms)
+    if not np.all(shapely.get_type_id(points) == 0):
+        points = shapely.centroid(points)
+    return shapely.get_x(points), shapely.get_y(points), gdf[name_field].to_numpy()
+
+
+def center_and_extent(lon: np.ndarray, lat: np.ndarray) -> tuple:
+    """
+    Center and extent of a set of points, with vectorized numpy.
+    :return: dict(lat=, lon=) of the mean location, and (min lon, min lat, max lon, max lat)
+    """
+    center = dict(lat=float(np.nanmean(lat)), lon=float(np.nanmean(lon)))
+    extent = (float(np.nanmin(lon)), float(np.nanmin(lat)), float(np.nanmax(lon)), float(np.nanmax(lat)))
+    return center, extent
+
+
+def _mercator(lon: np.ndarray, lat: np.ndarray) -> tuple:
+    """web mercator coordinates of lon and lat, scaled so the whole world is 0 to 1 in x and y"""
+    lat = np.clip(lat, -85.0511, 85.0511)
+    x = (np.asarray(lon) + 180) / 360
+    y = (1 - np.log(np.tan(np.radians(lat)) + 1 / np.cos(np.radians(lat))) / np.pi) / 2
+    return x, y
+
+
+def _inverse_mercator(x: np.ndarray, y: np.ndarray) -> tuple:
+    """lon and lat of web mercator coordinates scaled so the whole world is 0 to 1, the inverse of _mercator"""
+    lon = np.asarray(x) * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y)))))
+    return lon, lat
+
+
+def view_bounds(center: dict, zoom: float, width: int = 500, height: int = 500) -> tuple:
+    """
+    Extent of a map of width by height pixels centered on center at a zoom level, the inverse of zoom_for_extent
+    :param center: dict(lat=, lon=) of the map center
+    :return: (min lon, min lat, max lon, max lat)
+    """
+    x, y = _mercator(np.array(center['lon']), np.array(center['lat']))
+    half_width = width / 2 / (TILE_SIZE * 2 ** zoom)
+    half_height = height / 2 / (TILE_SIZE * 2 ** zoom)
+    min_lon, max_lat = _inverse_mercator(x - half_width, np.clip(y - half_height, 0, 1))
+    max_lon, min_lat = _inverse_mercator(x + half_width, np.clip(y + half_height, 0, 1))
+    return float(min_lon), float(min_lat), float(max_lon), float(max_lat)
+
+
+def zoom_for_extent(extent: tuple, width: int = 500, height: int = 500, max_zoom: int = 16) -> float:
+    """zoom level at which extent fits in a map of width by height pixels"""
+    x0, y1 = _mercator(np.array(extent[0]), np.array(extent[1]))
+    x1, y0 = _mercator(np.array(extent[2]), np.array(extent[3]))
+    span = max((x1 - x0) * TILE_SIZE / width, (y1 - y0) * TILE_SIZE / height, 1e-9)
+    return float(min(np.log2(1 / span), max_zoom))
+
+
+class MapClusters:
+    """
+    Grid clusters of a set of points, precomputed for every zoom level. At each zoom the points are grouped by the
+    CELL_SIZE pixel grid cell they fall in, and each cluster is drawn at the mean location of its points, so a map
+    of 100k wells carries at most a few thousand markers at any zoom and expands into single wells as it zooms in.
+
+    Simple Example:
+
+        clusters = MapClusters(lon, lat, names)
+        fig.add_trace(go.Scattermapbox(**clusters.trace_kwargs(zoom=8)))
+    """
+
+    def __init__(self, lon, lat, names=None, max_zoom: int = 18):
+        """
+        :param lon: array of longitudes
+        :param lat: array of latitudes
+        :param names: array of the point names, shown for clusters of one point
+        :param max_zoom: highest zoom level to precompute clusters for
+        """
+        self.lon = np.asarray(lon, dtype=float)
+        self.lat = np.asarray(lat, dtype=float)
+        self.names = np.asarray(names if names is not None else np.arange(len(self.lon)), dtype=str)
+        self.max_zoom = max_zoom
+        x, y = _mercator(self.lon, self.lat)
+        self.levels = [self._cluster(x, y, zoom) for zoom in range(max_zoom + 1)]
+
+    def _cluster(self, x: np.ndarray, y: np.ndarray, zoom: int) -> dict:
+        """clusters of the points in the grid cells of one zoom level"""
+        cells_per_side = 2 ** zoom * TILE_SIZE // CELL_SIZE
+        cell = (np.floor(x * cells_per_side).astype(np.int64) * cells_per_side
+                + np.floor(y * cells_per_side).astype(np.int64))
+        _, first, inverse, count = np.unique(cell, return_index=True, return_inverse=True, return_counts=True)
+        return {
+            'lon': np.bincount(inverse, weights=self.lon) / count,
+            'lat': np.bincount(inverse, weights=self.lat) / count,
+            'count': count,
+            'name': np.where(count == 1, self.names[first], np.char.add(count.astype(str), ' wells')),
+        }
+
+    def level(self, zoom: float, bounds: tuple = None) -> dict:
+        """
+        Clusters to draw at a zoom level
+        :param zoom: map zoom, rounded down to a precomputed level
+        :param bounds: (min lon, min lat, max lon, max lat) of the view, None for every cluster
+        :return: dict of lon, lat, count and name arrays
+        """
+        clusters = self.levels[int(np.clip(np.floor(zoom), 0, self.max_zoom))]
+        if bounds is None:
+            return clusters
+        keep = ((clusters['lon'] >= bounds[0]) & (clusters['lon'] <= bounds[2])
+                & (clusters['lat'] >= bounds[1]) & (clusters['lat'] <= bounds[3]))
+        return {key: values[keep] for key, values in clusters.items()}
+
+    def trace_kwargs(self, zoom: float, bounds: tuple = None, color='#1f77b4') -> dict:
+        """keyword arguments of a go.Scattermapbox of the clusters at a zoom level, marker size growing with count"""
+        clusters = self.level(zoom, bounds)
+        return dict(
+            lat=clusters['lat'],
+            lon=clusters['lon'],
+            mode='markers',
+            marker=dict(size=8 + 4 * np.log2(clusters['count']), color=color, opacity=0.8),
+            text=clusters['name'],
+            hovertemplate='%{text}<br>Lat: %{lat:.4f}<br>Lon: %{lon:.4f}<extra></extra>',
+            showlegend=False,
+        )
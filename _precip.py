@@ -0,0 +1,38 @@
+import pandas as pd
+
+#  aggregation names accepted by Subplot.add_precip, besides any pandas offset alias such as 'D', 'W' or 'MS'
+AGG_ALIASES = {
+    'daily': 'D',
+    'weekly': 'W',
+    'monthly': 'MS',
+    'yearly': 'YS',
+}
+CUMULATIVE_AGGS = ('water_year', 'WY')
+
+
+def water_year(dates: pd.DatetimeIndex, start_month: int = 10):
+    """water year of each date, named for the calendar year it ends in (Oct 1 2023 is in water year 2024)"""
+    return dates.year + (dates.month >= start_month).astype(int) if start_month != 1 else dates.year
+
+
+def aggregate_precip(df: pd.DataFrame, columns=None, agg: str = 'D', water_year_start: int = 10) -> pd.DataFrame:
+    """
+    Aggregate a precipitation record to totals per period, or to a running total per water year, with vectorized
+    resampling.
+    :param df: DataFrame where the first column is the date and the other columns are gauges
+    :param columns: columns of df to aggregate, defaults to every column after the date
+    :param agg: pandas offset alias of the period to total over ('D', 'W', 'MS', ...), one of 'daily', 'weekly',
+    'monthly' or 'yearly', or 'water_year' for the cumulative total of daily totals, reset each water year
+    :param water_year_start: month the water year starts in, defaults to October
+    :return: DataFrame indexed by date with one column per gauge. Periods with no data are nan, not 0
+    """
+    columns = df.columns[1:] if columns is None else columns
+    dates = pd.DatetimeIndex(df.iloc[:, 0])
+    data = df.loc[:, columns].apply(pd.to_numeric, errors='coerce')
+    data.index = dates
+    if not dates.is_monotonic_increasing:
+        data = data.sort_index()
+    if agg in CUMULATIVE_AGGS:
+        daily = data.resample('D').sum(min_count=1)
+        return daily.groupby(water_year(daily.index, water_year_start)).cumsum()
+    return data.resample(AGG_ALIASES.get(agg, agg)).sum(min_count=1)
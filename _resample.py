@@ -0,0 +1,250 @@
+import numpy as np
+from plotly import graph_objects as go
+
+
+def _numeric(x: np.ndarray) -> np.ndarray:
+    """x as a float array, dates as nanoseconds since the epoch"""
+    x = np.asarray(x)
+    if x.dtype.kind == 'M':
+        return x.astype('datetime64[ns]').view('int64').astype(float)
+    return x.astype(float)
+
+
+def minmax_indices(y, n_out: int) -> np.ndarray:
+    """
+    Indices of the points to keep so that the min and max of every bin are preserved. The data is split into
+    n_out / 2 bins of equal point count, so spikes and drops are never lost at any zoom.
+    :param y: array of values
+    :param n_out: maximum number of points to keep
+    :return: sorted array of indices into y
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    n_bins = max(n_out // 2, 1)
+    bin_size = -(-n // n_bins)
+    padded = np.full(n_bins * bin_size, np.nan)
+    padded[:n] = y
+    bins = padded.reshape(n_bins, bin_size)
+    offsets = np.arange(n_bins) * bin_size
+    mins = np.argmin(np.where(np.isnan(bins), np.inf, bins), axis=1) + offsets
+    maxs = np.argmax(np.where(np.isnan(bins), -np.inf, bins), axis=1) + offsets
+    indices = np.unique(np.concatenate([[0, n - 1], mins, maxs]))
+    return indices[indices < n]
+
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Indices of the points to keep with the Largest-Triangle-Three-Buckets algorithm, which keeps the points that
+    best preserve the visual shape of the line. Each bucket is computed with vectorized numpy; only the walk over
+    buckets is a python loop.
+    :param x: array of x values, numbers or datetime64
+    :param y: array of values
+    :param n_out: maximum number of points to keep, at least 3
+    :return: sorted array of indices into y
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = _numeric(x)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = np.nanmean(x[stop:next_stop]) if next_stop > stop else x[-1]
+        next_y = np.nanmean(y[stop:next_stop]) if next_stop > stop else y[-1]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        if np.all(np.isnan(areas)):
+            chosen = start
+        else:
+            chosen = start + int(np.nanargmax(areas))
+        indices[bucket + 1] = chosen
+        previous = chosen
+    return indices
+
+
+def downsample(x, y, n_out: int, method: str = 'minmax') -> tuple:
+    """
+    Downsample a line to at most n_out points
+    :param x: array of x values
+    :param y: array of y values
+    :param n_out: maximum number of points
+    :param method: 'minmax' to keep the min and max of each bin, or 'lttb' for Largest-Triangle-Three-Buckets
+    :return: x, y arrays
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if method == 'minmax':
+        indices = minmax_indices(y, n_out)
+    elif method == 'lttb':
+        indices = lttb_indices(x, y, n_out)
+    else:
+        raise ValueError("method must be either minmax or lttb")
+    return x[indices], y[indices]
+
+
+def _x_value(value, x: np.ndarray):
+    """convert a plotly axis range value to the type of x"""
+    if x.dtype.kind == 'M':
+        import pandas as pd
+        return np.datetime64(pd.Timestamp(value), 'ns')
+    return float(value)
+
+
+def visible_slice(x, y, x_range=None) -> tuple:
+    """the part of a sorted line inside x_range, with one point either side so the line runs off the plot edge"""
+    x, y = np.asarray(x), np.asarray(y)
+    if x_range is None or not len(x):
+        return x, y
+    first = np.searchsorted(x, _x_value(x_range[0], x), side='left')
+    last = np.searchsorted(x, _x_value(x_range[1], x), side='right')
+    first, last = max(first - 1, 0), min(last + 1, len(x))
+    return x[first:last], y[first:last]
+
+
+def x_range_from_relayout(relayout_data: dict, axis: str = 'xaxis'):
+    """
+    Get the x range from a Dash relayoutData event.
+    :return: (start, end) of the new range, None if the axis was autoranged, False if the event didn't change it
+    """
+    if not relayout_data:
+        return False
+    if f'{axis}.autorange' in relayout_data:
+        return None
+    if f'{axis}.range[0]' in relayout_data:
+        return relayout_data[f'{axis}.range[0]'], relayout_data[f'{axis}.range[1]']
+    if f'{axis}.range' in relayout_data:
+        return tuple(relayout_data[f'{axis}.range'])
+    return False
+
+
+def merge_series(series: list) -> tuple:
+    """
+    Merge (name, x, y) series into one line, with a NaN separator after each series so each is still drawn as its
+    own line.
+    :return: x, y, and the series name of each point
+    """
+    xs, ys, names = [], [], []
+    for name, x, y in series:
+        x = np.asarray(x)
+        xs.extend([x, np.array([np.datetime64('NaT') if x.dtype.kind == 'M' else np.nan], dtype=x.dtype)])
+        ys.extend([np.asarray(y, dtype='float32'), np.array([np.nan], dtype='float32')])
+        names.append(np.repeat(np.array([name], dtype=object), len(x) + 1))
+    return np.concatenate(xs), np.concatenate(ys), np.concatenate(names)
+
+
+def split_series(x, y, names, members: list) -> list:
+    """inverse of merge_series: the (name, x, y) of each of members, without the separators"""
+    names = np.asarray(names)
+    series = []
+    for name in members:
+        keep = np.flatnonzero(names == name)[:-1]
+        series.append((name, x[keep], y[keep]))
+    return series
+
+
+class Resampler:
+    """
+    Keeps the full resolution data of the traces of a figure, so the traces can carry at most max_points points
+    per visible range and be re-aggregated when the view changes.
+
+    Simple Example:
+
+        fig = Fig()
+        fig.add_water_levels(store=store, max_points=2000)
+        fig.resample(x_range=('2020-01-01', '2021-01-01'))
+        fig.nonresampled().write_html('full.html')
+    """
+
+    def __init__(self, max_points: int = 2000, method: str = 'minmax'):
+        """
+        :param max_points: maximum number of points per trace in the visible range
+        :param method: 'minmax' or 'lttb'
+        """
+        self.max_points = max_points
+        self.method = method
+        self.full_data = {}
+        #  consolidated trace name to the names of the wells merged into it, their full data is in full_data
+        self.groups = {}
+        #  x range of the last resample, None for the full range
+        self.x_range = None
+
+    def __contains__(self, name):
+        return name in self.full_data or name in self.groups
+
+    def _store(self, name: str, x, y):
+        """keep the full resolution data of a well, sorted by x"""
+        import pandas as pd
+        x, y = pd.Index(x).to_numpy(), np.asarray(y)
+        if len(x) and not np.all(x[:-1] <= x[1:]):
+            order = np.argsort(x, kind='stable')
+            x, y = x[order], y[order]
+        self.full_data[name] = (x, y)
+
+    def add(self, name: str, x, y) -> tuple:
+        """keep the full resolution data of a trace and return its downsampled x and y"""
+        self._store(name, x, y)
+        return downsample(*self.full_data[name], self.max_points, self.method)
+
+    def add_group(self, trace_name: str, series: list) -> dict:
+        """
+        Keep the full resolution data of the wells merged into a consolidated trace
+        :param trace_name: name of the consolidated trace
+        :param series: list of (name, x, y) of the wells in the trace
+        :return: dict of the downsampled x, y and customdata (the well of each point) of the trace
+        """
+        self.groups[trace_name] = [name for name, _, _ in series]
+        for name, x, y in series:
+            self._store(name, x, y)
+        return self.trace_data(trace_name)
+
+    def extend(self, name: str, x, y):
+        """append rows to the full resolution data of a well"""
+        old_x, old_y = self.full_data[name]
+        self._store(name, np.concatenate([old_x, np.asarray(x)]), np.concatenate([old_y, np.asarray(y)]))
+
+    def trace_data(self, trace_name: str, x_range=None, full: bool = False) -> dict:
+        """
+        Data of a trace downsampled to x_range (None for the full range), or at full resolution
+        :return: dict of x and y, and customdata for consolidated traces
+        """
+        if trace_name not in self.groups:
+            x, y = self.full_data[trace_name]
+            if not full:
+                x, y = downsample(*visible_slice(x, y, x_range), self.max_points, self.method)
+            return {'x': x, 'y': y}
+        members = self.groups[trace_name]
+        #  the wells of a consolidated trace share its point budget
+        n_out = max(self.max_points // len(members), 4)
+        series = []
+        for name in members:
+            x, y = self.full_data[name]
+            if not full:
+                x, y = downsample(*visible_slice(x, y, x_range), n_out, self.method)
+            series.append((name, x, y))
+        x, y, names = merge_series(series)
+        return {'x': x, 'y': y, 'customdata': names}
+
+    def resample(self, fig: go.Figure, x_range=None):
+        """re-aggregate the traces of fig that have full resolution data to the x_range, None for the full range"""
+        self.x_range = x_range
+        with fig.batch_update():
+            for trace in fig.data:
+                if trace.name in self:
+                    trace.update(self.trace_data(trace.name, x_range))
+
+    def nonresampled(self, fig: go.Figure) -> go.Figure:
+        """copy of fig with the full resolution data in every resampled trace"""
+        full_fig = go.Figure(fig)
+        with full_fig.batch_update():
+            for trace in full_fig.data:
+                if trace.name in self:
+                    trace.update(self.trace_data(trace.name, full=True))
+        return full_fig
@@ -0,0 +1,111 @@
+from pathlib import Path
+import io
+import json
+import numpy as np
+from figs._arrays import array_key
+
+#  name of the json document inside a saved figure archive, every other entry is a trace array
+FIG_KEY = '__fig__'
+ARRAY_REF = '__array__'
+
+
+def _default(obj):
+    """convert what orjson can't serialize natively"""
+    if hasattr(obj, 'to_plotly_json'):
+        return obj.to_plotly_json()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f'cannot serialize {type(obj).__name__}')
+
+
+def dumps(obj) -> str:
+    """
+    JSON string of a figure dict. Uses orjson, which serializes numpy arrays natively without going through python
+    lists, and falls back to plotly's encoder if orjson isn't installed.
+    """
+    try:
+        import orjson
+    except ImportError:
+        import plotly.io as pio
+        return pio.to_json(obj, validate=False)
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    return orjson.dumps(obj, default=_default, option=option).decode()
+
+
+def loads(data):
+    """parse a JSON string or bytes, with orjson if it's installed"""
+    try:
+        import orjson
+    except ImportError:
+        return json.loads(data)
+    return orjson.loads(data)
+
+
+def _split_arrays(obj, arrays: dict, keys: dict):
+    """replace numeric numpy arrays in obj with references to entries of arrays, storing identical arrays once"""
+    if isinstance(obj, dict):
+        return {k: _split_arrays(v, arrays, keys) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)) and not isinstance(obj, str):
+        return [_split_arrays(item, arrays, keys) for item in obj]
+    if isinstance(obj, np.ndarray) and obj.dtype.kind in 'fiubM':
+        key = array_key(obj)
+        if key not in keys:
+            keys[key] = f'a{len(arrays)}'
+            arrays[keys[key]] = obj
+        return {ARRAY_REF: keys[key]}
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return obj
+
+
+def _join_arrays(obj, arrays):
+    """inverse of _split_arrays"""
+    if isinstance(obj, dict):
+        if ARRAY_REF in obj and len(obj) == 1:
+            return arrays[obj[ARRAY_REF]]
+        return {k: _join_arrays(v, arrays) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_join_arrays(item, arrays) for item in obj]
+    return obj
+
+
+def save_fig(fig, file, compress: bool = False):
+    """
+    Save a figure in a compact format: a numpy .npz archive where the layout and trace attributes are one json
+    document and every numeric or date trace array is stored as a raw numpy buffer.
+    :param fig: plotly figure to save
+    :param file: Path or writable binary file object
+    :param compress: zip-compress the archive, which makes it smaller but slower to write and read than pickle
+    (see _bench.bench_serialization)
+    """
+    import plotly.graph_objects as go
+    arrays = {}
+    fig_dict = _split_arrays(go.Figure.to_plotly_json(fig), arrays, {})
+    arrays[FIG_KEY] = np.frombuffer(dumps(fig_dict).encode(), dtype='u1')
+    save = np.savez_compressed if compress else np.savez
+    if isinstance(file, Path):
+        #  write through a file object so numpy doesn't append .npz to the name
+        file.parent.mkdir(parents=True, exist_ok=True)
+        with open(file, 'wb') as f:
+            save(f, **arrays)
+    else:
+        save(file, **arrays)
+
+
+def load_fig_dict(file) -> dict:
+    """
+    Load the figure dict saved by save_fig, with its trace arrays as numpy arrays.
+    :param file: Path, readable binary file object, or the bytes of a saved figure
+    """
+    if isinstance(file, bytes):
+        file = io.BytesIO(file)
+    with np.load(file, allow_pickle=False) as archive:
+        arrays = {key: archive[key] for key in archive.files}
+    fig_dict = loads(arrays.pop(FIG_KEY).tobytes())
+    return _join_arrays(fig_dict, arrays)
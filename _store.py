@@ -0,0 +1,200 @@
+from pathlib import Path
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+class WaterLevelStore:
+    """
+    On-disk store of water level records, one well per pair of contiguous NumPy arrays (int64 timestamps in
+    nanoseconds and float32 values), plus a small json index with the length and time bounds of each well.
+
+    Arrays are opened memory-mapped, so getting a well or a time slice of a well is a zero-copy view and a network
+    of hundreds of wells never has to be loaded into memory at once.
+
+    Simple Example:
+
+        store = WaterLevelStore.from_data(Path('network_store'), ExcelDateData(excel_paths))
+        fig = Fig()
+        fig.add_water_levels(store=store, wells=['MW-1', 'MW-2'])
+    """
+
+    index_name = 'index.json'
+
+    def __init__(self, store_dir: Path):
+        """
+        :param store_dir: directory holding the arrays and index of the store. Created if it doesn't exist
+        """
+        assert isinstance(store_dir, Path), 'store_dir must be a Path object'
+        self.store_dir = store_dir
+        self._index = None
+        self._arrays = {}
+
+    @classmethod
+    def from_data(cls, store_dir: Path, data, dtype='float32'):
+        """
+        Create a store from date indexed data
+        :param store_dir: directory to write the store to
+        :param data: ExcelDateData, a DataFrame indexed by date, or a list of DataFrames indexed by date
+        :param dtype: dtype to store the values as
+        """
+        store = cls(store_dir)
+        if isinstance(data, pd.DataFrame):
+            data = [data]
+        elif hasattr(data, 'dfs'):
+            data = data.dfs
+        for df in data:
+            store.add_dataframe(df, dtype=dtype)
+        return store
+
+    @property
+    def index(self) -> dict:
+        """dict of well names to the file, length and time bounds of their arrays"""
+        if self._index is None:
+            index_path = self.store_dir / self.index_name
+            self._index = json.loads(index_path.read_text()) if index_path.exists() else {}
+        return self._index
+
+    @property
+    def wells(self) -> list:
+        """names of the wells in the store"""
+        return list(self.index.keys())
+
+    def _write_index(self):
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        index_path = self.store_dir / self.index_name
+        temp_path = index_path.with_name(f'{self.index_name}.{os.getpid()}.tmp')
+        temp_path.write_text(json.dumps(self.index, indent=1))
+        os.replace(temp_path, index_path)
+
+    @staticmethod
+    def _save_array(path: Path, arr: np.ndarray):
+        """
+        write arr to path through a temporary file, so arrays memory-mapped by readers are never rewritten in place
+        """
+        temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        #  through a file object so numpy doesn't append .npy to the temporary name
+        with open(temp_path, 'wb') as file:
+            np.save(file, arr)
+        os.replace(temp_path, path)
+
+    def add_well(self, name: str, dates, values, dtype='float32', write_index=True):
+        """
+        Add or replace the record of a well. Rows with missing values are dropped and rows are sorted by date.
+        :param name: name of the well
+        :param dates: datetime-like array of dates
+        :param values: array of water levels, same length as dates
+        :param dtype: dtype to store the values as
+        :param write_index: write the index to disk after adding, can be turned off when adding many wells
+        """
+        timestamps = pd.DatetimeIndex(dates).as_unit('ns').asi8
+        values = np.asarray(values, dtype=dtype)
+        assert len(timestamps) == len(values), 'dates and values must be the same length'
+        keep = ~np.isnan(values)
+        timestamps, values = timestamps[keep], values[keep]
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, values = timestamps[order], values[order]
+
+        file = self.index[name]['file'] if name in self.index else f'well{len(self.index):05d}'
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self._save_array(self.store_dir / f'{file}.t.npy', timestamps)
+        self._save_array(self.store_dir / f'{file}.v.npy', values)
+        self._arrays.pop(name, None)
+        self.index[name] = {
+            'file': file,
+            'count': int(len(timestamps)),
+            'start': int(timestamps[0]) if len(timestamps) else None,
+            'end': int(timestamps[-1]) if len(timestamps) else None,
+        }
+        if write_index:
+            self._write_index()
+
+    def add_dataframe(self, df: pd.DataFrame, dtype='float32'):
+        """add every column of a date indexed DataFrame as a well"""
+        assert pd.api.types.is_datetime64_any_dtype(df.index), 'index of df must be datetime64'
+        for col in df.columns:
+            self.add_well(str(col), df.index, df[col], dtype=dtype, write_index=False)
+        self._write_index()
+
+    def arrays(self, name: str) -> tuple:
+        """memory-mapped timestamp (int64 ns) and value arrays of a well"""
+        if name not in self._arrays:
+            file = self.index[name]['file']
+            self._arrays[name] = (
+                np.load(self.store_dir / f'{file}.t.npy', mmap_mode='r'),
+                np.load(self.store_dir / f'{file}.v.npy', mmap_mode='r'),
+            )
+        return self._arrays[name]
+
+    def bounds(self, name: str) -> tuple:
+        """first and last date of a well's record, read from the index"""
+        well = self.index[name]
+        if well['start'] is None:
+            return None, None
+        return pd.Timestamp(well['start']), pd.Timestamp(well['end'])
+
+    def get(self, name: str, start=None, end=None) -> tuple:
+        """
+        Get the dates and values of a well between start and end as zero-copy views of the memory-mapped arrays.
+        :param name: name of the well
+        :param start: first date to include, None starts at the beginning of the record
+        :param end: last date to include, None goes to the end of the record
+        :return: datetime64[ns] array of dates, array of values
+        """
+        timestamps, values = self.arrays(name)
+        first = 0 if start is None else np.searchsorted(timestamps, pd.Timestamp(start).value, side='left')
+        last = len(timestamps) if end is None else np.searchsorted(timestamps, pd.Timestamp(end).value, side='right')
+        return timestamps[first:last].view('datetime64[ns]'), values[first:last]
+
+
+class WellIndex:
+    """
+    In-memory per-well index of a wide DataFrame indexed by date, built once. Holds the non-null dates and values
+    of each well and their time bounds, so looking up N wells is N dict lookups instead of N dropna passes over the
+    whole frame. Has the same get/bounds/wells interface as WaterLevelStore, so either can be passed as the store to
+    Fig.add_water_levels and Subplot.add_water_levels.
+    """
+
+    def __init__(self, df: pd.DataFrame, dtype='float32'):
+        """
+        :param df: DataFrame indexed by date, where each column is a well
+        :param dtype: dtype to hold the values as
+        """
+        assert pd.api.types.is_datetime64_any_dtype(df.index), 'index of df must be datetime64'
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        dates = df.index.to_numpy(dtype='datetime64[ns]')
+        self._wells = {}
+        for col in df.columns:
+            values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=dtype, na_value=np.nan)
+            keep = ~np.isnan(values)
+            self._wells[str(col)] = (dates[keep], values[keep])
+
+    def __contains__(self, name):
+        return name in self._wells
+
+    @property
+    def wells(self) -> list:
+        """names of the wells in the index"""
+        return list(self._wells.keys())
+
+    def bounds(self, name: str) -> tuple:
+        """first and last date with a value for a well"""
+        dates, _ = self._wells[name]
+        if not len(dates):
+            return None, None
+        return pd.Timestamp(dates[0]), pd.Timestamp(dates[-1])
+
+    def get(self, name: str, start=None, end=None) -> tuple:
+        """
+        Get the non-null dates and values of a well between start and end, as views of the indexed arrays.
+        :param name: name of the well
+        :param start: first date to include, None starts at the beginning of the record
+        :param end: last date to include, None goes to the end of the record
+        :return: datetime64[ns] array of dates, array of values
+        """
+        dates, values = self._wells[name]
+        first = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side='left')
+        last = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side='right')
+        return dates[first:last], values[first:last]
@@ -1,15 +1,57 @@
-import os
-from figs._fig import Fig
-from svglib.svglib import svg2rlg
-from reportlab.graphics import renderPDF
-from reportlab.graphics.shapes import Drawing
-import plotly.io as pio
+from __future__ import annotations
+import io
+from typing import TYPE_CHECKING
 import xml.etree.ElementTree as ETree
-import svgpathtools as svgtools
-from bokeh.plotting import figure, show
-from bokeh.models import Range1d
-from bokeh.io.export import get_svg, export_svg
-import cairosvg
+from figs._fig import Fig
+from figs._layout import plot_area
+from figs._autorange import AutorangeCache
+
+#  the svg, pdf and bokeh export libraries are only imported by the methods that use them, so importing a figure
+#  class doesn't pay for the whole export stack
+if TYPE_CHECKING:
+    from bokeh.plotting import figure
+    from svglib.svglib import svg2rlg
+
+
+def write_to(sink, data: bytes):
+    """write bytes to a path, or to a writable binary file object such as an open file or a BytesIO"""
+    if hasattr(sink, 'write'):
+        sink.write(data)
+    else:
+        with open(sink, 'wb') as file:
+            file.write(data)
+
+
+def svg_drawing(svg: bytes):
+    """reportlab drawing of SVG bytes, parsed by svglib from memory"""
+    from svglib.svglib import svg2rlg
+    return svg2rlg(io.BytesIO(svg))
+
+
+def drawing_to_pdf(drawing) -> bytes:
+    """PDF bytes of a reportlab drawing, rendered in memory"""
+    from reportlab.graphics import renderPDF
+    from reportlab.graphics.shapes import Drawing
+    rendered_drawing = Drawing(drawing.width, drawing.height)
+    rendered_drawing.add(drawing)
+    return renderPDF.drawToString(rendered_drawing)
+
+
+def _range_value(value):
+    """axis range value as a number, dates as milliseconds since the epoch like the computed autoranges"""
+    if isinstance(value, str):
+        import pandas as pd
+        return pd.Timestamp(value).value / 1e6
+    return value
+
+
+def _rebuild_scalable_figure(cls, fig_dict: dict, state: dict):
+    """rebuild a pickled ScalableFigure, see ScalableFigure.__reduce__"""
+    fig = cls()
+    fig.layout = fig_dict.get('layout', {})
+    fig.add_traces(fig_dict.get('data', []))
+    fig.__dict__.update(state)
+    return fig
 
 
 class ScalableFigure(Fig):
@@ -41,10 +83,13 @@ class ScalableFigure(Fig):
             plot_width_in_base_units=17,
             plot_height_in_base_units=11,
             dots_per_base_unit = None,
+            verify_svg=False,
             *args,
             **kwargs
     ):
         super().__init__(*args, **kwargs)
+        #  measure the plot area from a rendered SVG instead of computing it, to cross-check plot_area
+        self._verify_svg = verify_svg
         self._x_range = None
         self._y_range = None
         self._svg_path = svg_path
@@ -63,7 +108,30 @@ class ScalableFigure(Fig):
         self.y_scale_exaggeration = y_scale_exaggeration
         self._xaxis_anchor = True
         self._tree = None
+        self._svg = None
         self._grid_dimensions = None
+        self._autorange_cache = AutorangeCache()
+
+    def __reduce__(self):
+        """
+        Pickle the figure with its scale settings, so it can be sent to worker processes. plotly's own __reduce__
+        would call the class with the figure dict as the first positional argument, which here is svg_path.
+        """
+        figure_attributes = set(Fig().__dict__)
+        state = {
+            key: value for key, value in self.__dict__.items()
+            if key not in figure_attributes and key not in ('_tree', '_autorange_cache')
+        }
+        return _rebuild_scalable_figure, (type(self), self.to_dict(), state)
+
+    @property
+    def verify_svg(self):
+        """always measure the grid from a rendered SVG, even when the computed plot area is exact"""
+        return self._verify_svg
+
+    @verify_svg.setter
+    def verify_svg(self, val):
+        self._verify_svg = bool(val)
 
     @property
     def y_scale_exaggeration(self):
@@ -121,18 +189,58 @@ class ScalableFigure(Fig):
 
     @property
     def element_tree(self):
-        """the entire XML representation of the SVG as an element tree"""
-        try:
-            self.write_svg()
-            self._tree = ETree.parse(self._svg_path)
-        except IOError:
-            print('no readable svg file found!')
-            self._tree = None
+        """the entire XML representation of the SVG as an element tree, rendered and parsed in memory"""
+        self._svg = self.to_svg()
+        self._tree = ETree.ElementTree(ETree.fromstring(self._svg))
         return self._tree
 
+    @property
+    def plot_area(self):
+        """the plot area (grid/canvas) of the figure on the page in dots, computed from the layout without rendering"""
+        return plot_area(self.layout, self.plot_width, self.plot_height, self.data)
+
     @property
     def grid_dimensions(self):
+        """dimensions of the grid/canvas area of the plot. Computed from the layout when that is exact, measured
+        from a rendered SVG when a legend or automargin may move the margins, or if verify_svg is True"""
+        area = self.plot_area
+        if self.verify_svg or not area['exact']:
+            return self.svg_grid_dimensions
+        self._grid_dimensions = {'width': area['width'], 'height': area['height']}
+        return self._grid_dimensions
+
+    def autorange(self, axis='x', grid_dimensions: dict = None):
+        """
+        Range of the x or y axis: the range set on the axis, else the range plotly's autorange would give it,
+        computed from the trace data without rendering and cached until the traces change. Axes the computation
+        can't place (such as category axes) fall back to plotly's full figure, rendered by kaleido. Date ranges
+        are in milliseconds since the epoch.
+        :param axis: 'x' or 'y'
+        :param grid_dimensions: width and height of the grid, defaults to the computed plot area
+        """
+        axis_layout = self.layout[f'{axis}axis']
+        if axis_layout.range is not None:
+            return tuple(axis_layout.range)
+        area = self.plot_area if grid_dimensions is None else grid_dimensions
+        length = area['width'] if axis == 'x' else area['height']
+        computed = self._autorange_cache.get(self.data, axis, axis_type=axis_layout.type, length=length)
+        if computed is not None:
+            return computed
+        full_range = self.full_figure_for_development(warn=False).layout[f'{axis}axis'].range
+        return tuple(_range_value(value) for value in full_range)
+
+    def check_grid_dimensions(self):
+        """compare the computed grid dimensions with the ones measured from a rendered SVG"""
+        computed = self.plot_area
+        measured = self.svg_grid_dimensions
+        differences = {key: computed[key] - measured[key] for key in ('width', 'height')}
+        print(f'computed grid: {computed}, measured grid: {measured}, difference: {differences}')
+        return differences
+
+    @property
+    def svg_grid_dimensions(self):
         """get the dimensions of the grid/canvas area of a scatter plot by parsing a plotly generated SVG"""
+        import svgpathtools as svgtools
         grid_dimensions = {}
         try:
             tree = self.element_tree
@@ -191,47 +299,76 @@ class ScalableFigure(Fig):
         y_scale_ratio = self.plot_height / grid_dimensions['height']
         return x_scale_ratio, y_scale_ratio
 
+    def to_svg(self) -> bytes:
+        """SVG of the figure at the page size, rendered in memory (on the shared export worker if enabled with
+        figs._export.use_export_worker)"""
+        from figs._export import export_image
+        return export_image(self, format='svg', width=self.plot_width, height=self.plot_height)
+
     def write_svg(self, filename: str = None):
-        """writes an SVG representation of the figure to a *.svg file"""
+        """writes an SVG representation of the figure to a *.svg file, or to a writable binary file object"""
         if filename is None:
             filename = self._svg_path
         print('writing SVG to', filename)
-        pio.write_image(
-            self,
-            format='svg',
-            file=filename,
-            width=self.plot_width,
-            height=self.plot_height)
+        write_to(filename, self.to_svg())
+
+    def to_scaled_pdf(self, adjust_by='range', pdf_renderer='rlg') -> bytes:
+        """
+        PDF of the figure at scale. The SVG and PDF only ever exist in memory, so several figures can be exported
+        at once in one process or directory.
+        :param adjust_by: 'range' to change the axes ranges to the scale, or 'page' to scale the page
+        :param pdf_renderer: 'rlg' (svglib and reportlab) or 'cairo' (cairosvg, range only)
+        :return: bytes of the PDF
+        """
+        if adjust_by not in ('page', 'range'):
+            raise ValueError("adjust_by must equal 'page' or 'range'")
+        if pdf_renderer == 'cairo':
+            if adjust_by == 'page':
+                raise ValueError("the cairo renderer can only adjust_by 'range'")
+            import cairosvg
+            return cairosvg.svg2pdf(bytestring=self._scale_range(pdf_renderer='cairo'))
+        drawing = self._scale_page() if adjust_by == 'page' else self._scale_range()
+        return drawing_to_pdf(drawing)
+
+    def scaled_svg(self, adjust_by='range') -> tuple:
+        """
+        SVG of the figure at scale, and the factors to scale its drawing by
+        :param adjust_by: 'range' to change the axes ranges to the scale, the factors are then 1, or 'page' to
+        scale the page by the returned factors
+        :return: svg bytes, x scale factor, y scale factor
+        """
+        if adjust_by == 'page':
+            measured = self.verify_svg or not self.plot_area['exact']
+            scale_x, scale_y = self._get_plot_to_grid_scale_ratios()
+            #  measuring the grid from an SVG already rendered it, otherwise it hasn't been rendered yet
+            svg = self._svg if measured and self._svg is not None else self.to_svg()
+            return svg, scale_x, scale_y
+        if adjust_by == 'range':
+            return self._scale_range(pdf_renderer='svg'), 1, 1
+        raise ValueError("adjust_by must equal 'page' or 'range'")
 
     def write_scaled_pdf(
             self,
             delete_svg=True,
             adjust_by='range',
-            pdf_renderer='rlg'
+            pdf_renderer='rlg',
+            file=None,
     ):
-        if pdf_renderer == 'rlg':
-            if adjust_by == 'page':
-                drawing = self._scale_page()
-            elif adjust_by == 'range':
-                drawing = self._scale_range()
-            else:
-                print("adjust_by must equal 'page' or 'range'")
-            self._write_pdf(drawing)
-
-        if pdf_renderer == 'cairo':
-            if adjust_by == 'page':
-                raise NotImplemented
-            if adjust_by == 'range':
-                self._scale_range(pdf_renderer='cairo')
-                cairosvg.svg2pdf(url=self._svg_path, write_to=self._pdf_path)
-
-        if delete_svg and os.path.exists(self._svg_path):
-            os.remove(self._svg_path)
+        """
+        Write the PDF of the figure at scale, see to_scaled_pdf
+        :param delete_svg: no longer used, the SVG is never written to disk
+        :param adjust_by: 'range' or 'page'
+        :param pdf_renderer: 'rlg' or 'cairo'
+        :param file: path or writable binary file object to write to, defaults to pdf_path
+        """
+        file = self._pdf_path if file is None else file
+        write_to(file, self.to_scaled_pdf(adjust_by=adjust_by, pdf_renderer=pdf_renderer))
+        print(f'wrote drawing {file}')
 
     def _scale_page(self):
         """scale the figure so that the plot grid/canvas is the size defined by plot_height and plot_width."""
-        scale_x, scale_y = self._get_plot_to_grid_scale_ratios()
-        drawing = svg2rlg(self._svg_path)
+        svg, scale_x, scale_y = self.scaled_svg(adjust_by='page')
+        drawing = svg_drawing(svg)
         # Scale the drawing
         drawing.width, drawing.height = drawing.width * scale_x, drawing.height * scale_y
         drawing.scale(scale_x, scale_y)
@@ -239,13 +376,14 @@ class ScalableFigure(Fig):
 
     def _scale_range(self, pdf_renderer='rlg'):
         """Scale the range of the figure, keeping the page size the same, so that
-        the x and y ranges are at the provided scale"""
+        the x and y ranges are at the provided scale. Returns the svglib drawing for the 'rlg' pdf_renderer,
+        otherwise the SVG bytes"""
         x_units_per_dot = [self.x_scale / self._dots_per_base_unit if self.x_scale is not None else 0]
         y_units_per_dot = [self.y_scale / self._dots_per_base_unit if self.y_scale is not None else 0]
         grid_dimensions = self.grid_dimensions
         #  get default minimum x-axis value based on data
-        x_min = self.full_figure_for_development(warn=False).layout.xaxis.range[0]
-        y_min = self.full_figure_for_development(warn=False).layout.yaxis.range[0]
+        x_min = self.autorange('x', grid_dimensions)[0]
+        y_min = self.autorange('y', grid_dimensions)[0]
         x_dots, y_dots = grid_dimensions['width'], grid_dimensions['height']
         x_span, y_span = x_dots * x_units_per_dot[0], y_dots * y_units_per_dot[0]
         if self._xaxis_anchor is True:
@@ -254,25 +392,22 @@ class ScalableFigure(Fig):
             self.update_yaxes(range=[y_min, y_min + y_span])
         self.update_xaxes(range=[x_min, (x_min + x_span)])
 
-        #   write a new svg file with the updated, scaled axes ranges
-        self.write_svg()
+        #   render a new svg with the updated, scaled axes ranges
+        svg = self.to_svg()
 
         if pdf_renderer == 'rlg':
             print('using rlg')
-            drawing = svg2rlg(self._svg_path)
-            return drawing
+            return svg_drawing(svg)
 
         if pdf_renderer == 'cairo':
             print('using cairo')
+        return svg
 
     def _write_pdf(self, drawing: svg2rlg, pdf_path=None):
-        """write a pdf from a svg2rlg drawing"""
+        """write a pdf from a svg2rlg drawing to a path or writable binary file object"""
         if pdf_path is None:
             pdf_path = self._pdf_path
-        rendered_drawing = Drawing(drawing.width, drawing.height)
-        rendered_drawing.add(drawing)
-        # Render the drawing to PDF
-        renderPDF.drawToFile(rendered_drawing, pdf_path)
+        write_to(pdf_path, drawing_to_pdf(drawing))
         print(f'wrote drawing {pdf_path}')
 
 class BokehScalableFigure:
@@ -295,6 +430,7 @@ class BokehScalableFigure:
         self.x_start = x_start  # minimum x value in real-world units
         self.y_start = y_start  # minimum y value in real-world units
         if bokeh_figure is None:
+            from bokeh.plotting import figure
             self.figure = figure(
                 width=self.plot_width, height=self.plot_height,
                 output_backend="svg")
@@ -307,13 +443,22 @@ class BokehScalableFigure:
         # Default file paths
         self.svg_path = 'temp_plot.svg'
         self.pdf_path = 'temp_plot.pdf'
+        self._svg = None
 
     def add_line(self, x, y, **kwargs):
         self.figure.line(x, y, **kwargs)
 
-    def write_svg(self):
+    def to_svg(self) -> bytes:
+        """SVG of the current figure, rendered in memory"""
+        from bokeh.io.export import get_svg
+        svg = get_svg(self.figure)
+        svg = svg[0] if isinstance(svg, list) else svg
+        self._svg = svg.encode()
+        return self._svg
+
+    def write_svg(self, file=None):
         # Save the current figure as svg
-        export_svg(self.figure, filename=self.svg_path)
+        write_to(self.svg_path if file is None else file, self.to_svg())
 
     @property
     def x_scale(self):
@@ -349,7 +494,8 @@ class BokehScalableFigure:
 
     @property
     def root(self):
-        root = ETree.parse(self.svg_path).getroot()
+        """root element of the last rendered SVG, rendering it if it hasn't been"""
+        root = ETree.fromstring(self._svg if self._svg is not None else self.to_svg())
         self._root = root
         return self._root
 
@@ -357,6 +503,7 @@ class BokehScalableFigure:
         """Parses the figure SVG to get the scaled x and y ranges.
         Determines the actual axes spans in inches and scales the ranges so that the
         specified x_scale and y_scale are true."""
+        import svgpathtools as svgtools
         root = self.root
         elements = [element for element in root.iter()]
         #  get the bounding box of the grid of the svg plot exported from Bokeh. the element with the
@@ -377,28 +524,23 @@ class BokehScalableFigure:
 
         return x_range, y_range
 
-    def write_scaled_pdf(self):
-        svg_path = self.svg_path
-        pdf_path = self.pdf_path
+    def to_scaled_pdf(self) -> bytes:
+        """PDF of the figure at scale, with the SVGs and PDF only ever in memory"""
+        from bokeh.models import Range1d
 
-        #  write and parse inital svg, adust the figure ranges, and then write the scaled svg
-        self.write_svg()
-        print('wrote 1st svg')
+        #  render and parse inital svg, adust the figure ranges, and then render the scaled svg
+        self.to_svg()
         x_range, y_range = self.get_scaled_grid_dimensions()
         self.figure.x_range = Range1d(*x_range)
         self.figure.y_range = Range1d(*y_range)
-        self.write_svg()
-        print('wrote scaled svg')
 
         # Convert SVG to PDF while maintaining scale
-        drawing = svg2rlg(svg_path)
-
-        # Create a ReportLab drawing and render the SVG drawing into it
-        rendered_drawing = Drawing(drawing.width, drawing.height)
-        rendered_drawing.add(drawing)
+        return drawing_to_pdf(svg_drawing(self.to_svg()))
 
-        # Write to a PDF
-        renderPDF.drawToFile(rendered_drawing, pdf_path)
+    def write_scaled_pdf(self, file=None):
+        """write the PDF of the figure at scale to a path or writable binary file object, defaults to pdf_path"""
+        pdf_path = self.pdf_path if file is None else file
+        write_to(pdf_path, self.to_scaled_pdf())
         print(f'PDF exported to {pdf_path}')
 
 